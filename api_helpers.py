@@ -1,19 +1,129 @@
 import aiohttp
 import asyncio
+import atexit
+import os
+import random
+import threading
 
-def get_tasks(url, session, operations, number_questions, params):
-    """Create a list of tasks for asyncio to perform asynchronously."""
-    tasks = []
-    for i in range(number_questions):
-        tasks.append(session.get(f"{url}/{operations}", params=params, ssl=False))
-    return tasks
-
-async def get_math_data(url, operations, number_questions, params):
-    """Asynchronously call math api to return a list of math expressions."""
-    results = []
-    async with aiohttp.ClientSession() as session:
-            tasks = get_tasks(url, session, operations, number_questions, params)
-            responses = await asyncio.gather(*tasks)
-            for response in responses:
-                results.append(await response.json())
-    return results
\ No newline at end of file
+from config import (MATH_API_CONNECTION_LIMIT, MATH_API_DNS_CACHE_TTL, MATH_API_KEEPALIVE_TIMEOUT, MATH_API_CONCURRENCY,
+                    MATH_API_REQUEST_TIMEOUT, MATH_API_DEADLINE, MATH_API_RETRIES, MATH_API_RETRY_BACKOFF, MATH_API_HEDGE_DELAY)
+
+# One event loop and one client session per worker process, so connections to the math api are reused between requests.
+_loop = None
+_loop_pid = None
+_session = None
+_loop_lock = threading.Lock()
+
+def get_event_loop():
+    """Get the event loop for this process, starting it in a background thread the first time.  A new loop is started after a fork."""
+    global _loop, _loop_pid, _session
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            _session = None
+            threading.Thread(target=_loop.run_forever, name='math-api-loop', daemon=True).start()
+    return _loop
+
+def run_in_loop(coroutine):
+    """Run a coroutine on the shared event loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+async def get_client_session():
+    """Get the shared client session, creating it with a pooled connector if needed.  Must be called from the shared event loop."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=MATH_API_CONNECTION_LIMIT,
+            ttl_dns_cache=MATH_API_DNS_CACHE_TTL,
+            keepalive_timeout=MATH_API_KEEPALIVE_TIMEOUT,
+            )
+        _session = aiohttp.ClientSession(connector=connector)
+    return _session
+
+async def close_client_session():
+    """Close the shared client session."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+@atexit.register
+def shutdown_event_loop():
+    """Close the client session and stop the shared event loop when the process exits."""
+    if _loop is not None and _loop_pid == os.getpid() and _loop.is_running():
+        asyncio.run_coroutine_threadsafe(close_client_session(), _loop).result(timeout=5)
+        _loop.call_soon_threadsafe(_loop.stop)
+
+class MathAPIError(Exception):
+    """Raised when the math api could not return every question before the deadline and there is nothing to backfill with."""
+
+async def fetch_question(session, url, params, semaphore, sent=None):
+    """Fetch one question, retrying failed or timed out calls after a random backoff.  The sent event is set once a call has a
+    semaphore slot and is going out."""
+    timeout = aiohttp.ClientTimeout(total=MATH_API_REQUEST_TIMEOUT)
+    for attempt in range(MATH_API_RETRIES + 1):
+        try:
+            async with semaphore:
+                if sent is not None:
+                    sent.set()
+                async with session.get(url, params=params, ssl=False, timeout=timeout) as response:
+                    response.raise_for_status()
+                    return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            if attempt == MATH_API_RETRIES:
+                raise
+            # Full jitter so retries from many questions don't hit the api at the same moment.
+            await asyncio.sleep(random.uniform(0, MATH_API_RETRY_BACKOFF * 2 ** attempt))
+
+async def fetch_question_hedged(session, url, params, semaphore):
+    """Fetch one question.  If it is slower than the hedge delay, send a duplicate request and use whichever answers first.
+    The delay starts once the request has gone out, so requests waiting for a semaphore slot aren't hedged."""
+    sent = asyncio.Event()
+    tasks = {asyncio.ensure_future(fetch_question(session, url, params, semaphore, sent))}
+    error = None
+    try:
+        if MATH_API_HEDGE_DELAY > 0:
+            waiting = asyncio.ensure_future(sent.wait())
+            try:
+                await asyncio.wait(tasks | {waiting}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiting.cancel()
+            if sent.is_set():
+                done, pending = await asyncio.wait(tasks, timeout=MATH_API_HEDGE_DELAY)
+                if not done:
+                    tasks.add(asyncio.ensure_future(fetch_question(session, url, params, semaphore)))
+
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def get_math_data(url, operations, number_questions, params, session=None, backfill=None):
+    """Asynchronously call math api to return a list of math expressions.  Uses the shared client session unless one is passed in.
+
+    At most MATH_API_CONCURRENCY calls are in flight at once and the whole fan-out stops at MATH_API_DEADLINE.
+    Questions that failed or missed the deadline are generated with backfill(operations, number_questions, params) if given.
+    """
+    if session is None:
+        session = await get_client_session()
+    semaphore = asyncio.Semaphore(MATH_API_CONCURRENCY)
+    tasks = [asyncio.ensure_future(fetch_question_hedged(session, f"{url}/{operations}", params, semaphore)) for i in range(number_questions)]
+
+    done, pending = await asyncio.wait(tasks, timeout=MATH_API_DEADLINE)
+    for task in pending:
+        task.cancel()
+
+    results = [task.result() for task in tasks if task in done and task.exception() is None]
+    missing = number_questions - len(results)
+    if missing:
+        if backfill is None:
+            raise MathAPIError(f'{missing} of {number_questions} questions could not be fetched from the math api.')
+        results.extend(backfill(operations, missing, params))
+    return results
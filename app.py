@@ -1,23 +1,45 @@
+import hmac
 import os
-
-from flask import Flask, render_template, redirect, session, request, Response, url_for, flash, g
-from flask_debugtoolbar import DebugToolbarExtension
-from flask_weasyprint import HTML, render_pdf
+import logging
+from collections import deque
+from concurrent.futures import Future
+from itertools import chain
+
+import click
+from flask import Flask, render_template, redirect, session, request, Response, url_for, flash, g, abort, jsonify, has_request_context, stream_with_context
+from flask.ctx import _AppCtxGlobals
+from sqlalchemy.engine import Engine
 from sqlalchemy.exc import IntegrityError
 from flask_wtf.csrf import CSRFProtect
 
 from functools import wraps
-import asyncio
 
-from models import connect_db, db, User, PDF
-from forms import CreateWorksheetForm, UserRegisterEditForm, UserLoginForm, UserDeleteForm
-from api_helpers import get_math_data
-from resources import get_bucket
+from models import connect_db, db, upgrade_db, User, PDF, SaveJob, Worksheet, Draft
+from forms import CreateWorksheetForm, ClassSetForm, UserRegisterEditForm, UserLoginForm, UserDeleteForm
+from question_pool import draw_questions
+from question_generator import get_questions
+from storage import get_storage, ObjectNotFound, NotModified, InvalidRange
+from cleanup import cleanup_queue, find_orphaned_keys, purge_keys
+from config import S3_PRESIGNED_DOWNLOADS, MATERIALIZE_PDFS, DRAFT_MAX_AGE, RENDER_TIMEOUT, PDF_RENDERER, SQL_ECHO, METRICS_TOKEN, PROFILE_TOKEN
 from filters import date_time_format
+from pdf_cache import pdf_cache, get_cache_key, TEMPLATE_VERSION
+from render_service import render_service, RENDER_UNAVAILABLE
+from zip_stream import iter_zip
+from headers import content_disposition
+from grid_pdf import write_sheet_pdf, LAYOUT_VERSION
+from job_queue import JobQueue, JobQueueFull
+from pagination import paginate
+from user_cache import user_cache
+from passwords import login_throttle, PasswordQueueFull
+from import_report import get_import_report
+from metrics import metrics, instrument_engine, instrument_templates
+from profiler import profiler
 
 
 app = Flask(__name__)
 
+logger = logging.getLogger(__name__)
+
 app.config['DEBUG_TB_INTERCEPT_REDIRECTS'] = False
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', "very secret key")
 
@@ -27,9 +49,12 @@ if uri.startswith("postgres://"):
 
 app.config['SQLALCHEMY_DATABASE_URI'] = uri
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ECHO"] = True
+app.config["SQLALCHEMY_ECHO"] = SQL_ECHO
 
-toolbar = DebugToolbarExtension(app)
+# Only load the debug toolbar when debugging, so production workers don't import it.
+if app.debug:
+    from flask_debugtoolbar import DebugToolbarExtension
+    toolbar = DebugToolbarExtension(app)
 
 connect_db(app)
 
@@ -37,17 +62,19 @@ csrf = CSRFProtect(app)
 
 app.jinja_env.filters['date_time_format'] = date_time_format
 
-API_BASE_URL = "https://web-production-a407.up.railway.app"
+# Time every db query and template for /metrics and the request summary logs.
+instrument_engine(Engine, metrics)
+instrument_templates(app.jinja_env, metrics)
 
 ###################################################################################################
 # Route Decorators
 ###################################################################################################
 
 def check_session_questions(function):
-    """Check if there are questions in session.  If not redirect to index route."""
+    """Check if there is a draft worksheet for this session.  If not redirect to index route."""
     @wraps(function)
     def check_session_questions_decorator(*args, **kwargs):
-        if session.get('questions'):
+        if get_draft():
             return function(*args, **kwargs)
         else:
             flash('Please generate a new worksheet before accessing that page.', 'warning')
@@ -67,13 +94,167 @@ def check_if_authorized(function):
             return function(*args, **kwargs)
     return check_if_authorized_decorator
 
+###################################################################################################
+# Worksheet Drafts
+###################################################################################################
+
+def get_draft():
+    """Get the draft worksheet for this session from the db.  The session cookie only holds the draft id."""
+    if 'draft' not in g:
+        draft_id = session.get('draft')
+        g.draft = Draft.query.get(draft_id) if draft_id else None
+    return g.draft
+
+def save_draft(name, questions):
+    """Save newly generated questions as the draft worksheet for this session, replacing its previous draft."""
+    previous_id = session.get('draft')
+    if previous_id:
+        Draft.query.filter_by(id=previous_id).delete()
+    draft = Draft.create_new_draft(name, questions)
+    db.session.add(draft)
+    db.session.commit()
+    session['draft'] = draft.id
+    g.draft = draft
+    return draft
+
+###################################################################################################
+# PDF Rendering
+###################################################################################################
+
+SHEET_TYPES = ['worksheet', 'answer-key']
+
+# Ways to render a sheet, with the version of their layout that goes into the pdf cache key.
+# grid writes the fixed worksheet layout straight to pdf, weasyprint renders the html templates.
+RENDERERS = {
+    'grid': f'grid-{LAYOUT_VERSION}',
+    'weasyprint': TEMPLATE_VERSION,
+}
+
+def get_renderer(default=PDF_RENDERER):
+    """Get the renderer asked for in the query string, or the default."""
+    renderer = request.args.get('renderer')
+    return renderer if renderer in RENDERERS else default
+
+def get_saved_renderer(template_version):
+    """Get the renderer whose layout a worksheet was saved with.  Only the current layouts can be rendered, so worksheets saved
+    before their layout changed get the PDF_RENDERER default."""
+    for renderer, version in RENDERERS.items():
+        if version == template_version:
+            return renderer
+    return PDF_RENDERER
+
+def submit_sheet(sheet, questions, base_url=None, renderer=PDF_RENDERER):
+    """Start rendering a sheet and return a future for the pdf.  Grid pdfs take about a millisecond, so they are written right away instead of going to the render pool."""
+    if renderer == 'grid':
+        future = Future()
+        with metrics.span('pdf_grid'):
+            future.set_result(write_sheet_pdf(sheet, questions))
+        return future
+    html = render_template(f'{sheet}.html', questions=questions, render=True)
+    
+    # Timed until the pdf is ready, so time spent waiting for a render worker counts too.
+    token = metrics.start('pdf_weasyprint')
+    try:
+        future = render_service.submit(html, base_url)
+    except Exception:
+        metrics.finish(token, error=True)
+        raise
+    future.add_done_callback(lambda future: metrics.finish(token, error=future.cancelled() or future.exception() is not None))
+    return future
+
+def render_sheet_pdfs(questions, sheets=SHEET_TYPES, base_url=None, renderer=PDF_RENDERER):
+    """Render the pdfs for a list of sheets in parallel.  Sheets that were rendered before come from the pdf cache."""
+    keys = [get_cache_key(sheet, questions, RENDERERS[renderer]) for sheet in sheets]
+    pdfs = [pdf_cache.get(key) for key in keys]
+    
+    missing = [i for i, pdf in enumerate(pdfs) if pdf is None]
+    futures = [submit_sheet(sheets[i], questions, base_url, renderer) for i in missing]
+    for i, future in zip(missing, futures):
+        pdfs[i] = future.result(timeout=RENDER_TIMEOUT)
+        pdf_cache.set(keys[i], pdfs[i])
+    
+    return pdfs
+
+def render_sheet_pdf(sheet, questions, base_url=None, renderer=PDF_RENDERER):
+    """Render the pdf for a worksheet or answer key, reusing the cached pdf if the same sheet was rendered before."""
+    return render_sheet_pdfs(questions, [sheet], base_url, renderer)[0]
+
+def render_class_set(name, question_sets, base_url=None, renderer=PDF_RENDERER):
+    """Yield (filename, pdf) for the worksheet and answer key of each version of a class set in order.  A few pdfs are kept rendering ahead on the render pool, so they render in parallel without filling its queue."""
+    render_ahead = max(1, min(render_service.max_queue, render_service.max_workers * 2))
+    pending = deque()
+    for version, questions in enumerate(question_sets, start=1):
+        for sheet in SHEET_TYPES:
+            filename = f'{name} - Version {version} - {sheet.replace("-", " ").title()}.pdf'.replace('/', '-')
+            pending.append((filename, submit_sheet(sheet, questions, base_url, renderer)))
+            if len(pending) >= render_ahead:
+                filename, future = pending.popleft()
+                yield filename, future.result(timeout=RENDER_TIMEOUT)
+    while pending:
+        filename, future = pending.popleft()
+        yield filename, future.result(timeout=RENDER_TIMEOUT)
+
+def end_class_set(files):
+    """Yield the files of a class set, stopping at the first one that fails to render.  The zip is already being sent by then,
+    so a note saying the set is incomplete is added in place of the missing files and the archive is still ended properly."""
+    try:
+        yield from files
+    except Exception:
+        logger.exception('Class set failed part way through')
+        yield 'Incomplete - Some Versions Could Not Be Rendered.txt', b'Some versions of this class set could not be rendered.  Please try again.\n'
+
+###################################################################################################
+# Background Saving
+###################################################################################################
+
+def save_worksheet(job_id, worksheet_id):
+    """Render the worksheet and answer key pdfs for a saved worksheet, store them and save their metadata to the db.  Runs on a save worker thread."""
+    with app.app_context():
+        job = SaveJob.query.get(job_id)
+        job.status = 'running'
+        db.session.commit()
+        
+        try:
+            worksheet = Worksheet.query.get(worksheet_id)
+            new_worksheet = PDF.create_new_pdf(user_id=job.user_id, filename=f'{worksheet.name} - Worksheet.pdf', sheet_type='worksheet', worksheet_id=worksheet.id)
+            new_answer_key = PDF.create_new_pdf(user_id=job.user_id, filename=f'{worksheet.name} - Answer Key.pdf', sheet_type='answer key', worksheet_id=worksheet.id)
+            
+            # Render both sheets in parallel, reusing the pdfs rendered for the preview if they are still cached
+            worksheet_pdf, answer_key_pdf = render_sheet_pdfs(worksheet.get_questions(), ['worksheet', 'answer-key'], renderer=get_saved_renderer(worksheet.template_version))
+            
+            # Store the pdfs straight from memory
+            storage = get_storage()
+            storage.put(new_worksheet.unique_s3_filename, worksheet_pdf)
+            storage.put(new_answer_key.unique_s3_filename, answer_key_pdf)
+            
+            # Save worksheet metadata to db.
+            job.status = 'done'
+            db.session.add_all([new_worksheet, new_answer_key, job])
+            db.session.commit()
+            
+        except Exception:
+            db.session.rollback()
+            job = SaveJob.query.get(job_id)
+            job.status = 'failed'
+            job.error = 'Could not store the pdfs for your worksheet.  They will be rendered when you download them instead.'
+            db.session.commit()
+            raise
+
+save_queue = JobQueue(save_worksheet, name='save-worker')
+
 ###################################################################################################
 # Worksheet Routes
 ###################################################################################################
 
+def render_index(form, class_set_form=None):
+    """Show the new worksheet form.  The class set button posts the same form along with the class set's number of versions."""
+    if class_set_form is None:
+        class_set_form = ClassSetForm(formdata=None)
+    return render_template('index.html', form=form, class_set_form=class_set_form)
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    """Show form to allow users to specify parameters for their worksheet.  Use the form data to call X-Math API to get math problems."""
+    """Show form to allow users to specify parameters for their worksheet.  Use the form data to generate math problems."""
     form = CreateWorksheetForm()
     
     if request.method == 'GET':
@@ -84,27 +265,67 @@ def index():
         name = form.name.data
         operations = form.operations.data
         number_questions = int(form.number_questions.data)
-        minimum = form.minimum.data
-        maximum = form.maximum.data
-        allow_negative = form.allow_negative.data
-        
-        # params for API get request
-        params = dict()
-        params["max"] = maximum
-        params["min"] = minimum
-        if allow_negative:
-            params["negative"] = 1
+        params = get_question_params(form)
         
-        # Do API calls with asyncio
-        questions = asyncio.run(get_math_data(API_BASE_URL, operations, number_questions, params))
+        # Draw the questions from the pool of questions generated ahead of time
+        try:
+            questions = draw_questions(operations, number_questions, params)
+        except ValueError:
+            flash('Could not generate questions with those numbers.  Please try a different minimum and maximum.', 'danger')
+            return render_index(form)
         
-        # Add questions and worksheet name to session
-        session['questions'] = questions
-        session['name'] = name
+        # Keep the questions and worksheet name in the db, with only the draft id in the session cookie
+        save_draft(name, questions)
         
         return redirect(url_for('new_worksheet_detail'))
     
-    return render_template('index.html', form=form)
+    return render_index(form)
+
+def get_question_params(form):
+    """Get the params for generating questions from the new worksheet form."""
+    # params for API get request
+    params = dict()
+    params["max"] = form.maximum.data
+    params["min"] = form.minimum.data
+    if form.allow_negative.data:
+        params["negative"] = 1
+    return params
+
+@app.route('/class-set', methods=['POST'])
+def class_set():
+    """Generate several versions of a worksheet at once and download their worksheets and answer keys as a zip file.  The zip is streamed as the pdfs finish rendering."""
+    form = ClassSetForm()
+    
+    if not form.validate_on_submit():
+        return render_index(form, form)
+    
+    name = form.name.data
+    number_questions = int(form.number_questions.data)
+    variants = form.variants.data
+    
+    # Generate the questions for every version in one batch.
+    try:
+        questions = get_questions(form.operations.data, number_questions * variants, get_question_params(form))
+    except ValueError:
+        flash('Could not generate questions with those numbers.  Please try a different minimum and maximum.', 'danger')
+        return render_index(form, form)
+    question_sets = [questions[i:i + number_questions] for i in range(0, len(questions), number_questions)]
+    
+    # Wait for the first pdf before sending anything, so a busy render pool can still be reported instead of a broken zip.
+    files = render_class_set(name, question_sets, request.url, get_renderer())
+    try:
+        first = next(files)
+    except RENDER_UNAVAILABLE:
+        files.close()
+        flash('Too many worksheets are being made right now.  Please try again in a moment.', 'danger')
+        return render_index(form, form), 503
+    
+    return Response(
+        stream_with_context(iter_zip(end_class_set(chain([first], files)))),
+        mimetype='application/zip',
+        headers={"Content-Disposition": content_disposition(f'{name} - Class Set.zip')},
+        direct_passthrough=True,
+        )
  
 @app.route('/worksheet/new')
 @check_session_questions
@@ -116,21 +337,43 @@ def new_worksheet_detail():
 @check_session_questions
 def render_new_pdf(sheet):
     """Render pdf for new worksheet or answer key."""
-    html = render_template(f'{sheet}.html', questions=session['questions'])
-    return render_pdf(HTML(string=html))
+    if sheet not in SHEET_TYPES:
+        abort(404)
+    try:
+        pdf = render_sheet_pdf(sheet, get_draft().get_questions(), request.url, get_renderer())
+    except RENDER_UNAVAILABLE:
+        abort(503)
+    return Response(pdf, mimetype='application/pdf')
 
 ###################################################################################################
 # User Log In and Log Out
 ###################################################################################################
 
-@app.before_request
-def add_user_to_g():
-    """If user is logged in and in session add the user to flask global."""
+def load_current_user():
+    """Get the user logged in in session, or None.  Uses the user cache so the db is only queried when the user isn't cached."""
+    user_id = session.get('user')
+    if user_id is None:
+        return None
+    
+    identity = user_cache.get(user_id)
+    if identity is not None:
+        return User.from_identity(identity)
+    
+    user = User.query.get(user_id)
+    if user:
+        user_cache.set(user_id, user.get_identity())
+    return user
 
-    if 'user' in session:
-        g.user = User.query.get(session['user'])
-    else:
-        g.user = None
+class AppGlobals(_AppCtxGlobals):
+    """Flask global that only loads the logged in user the first time a request uses g.user."""
+    
+    def __getattr__(self, name):
+        if name == 'user' and has_request_context():
+            self.user = load_current_user()
+            return self.user
+        raise AttributeError(name)
+
+app.app_ctx_globals_class = AppGlobals
 
 
 def do_login(user):
@@ -145,6 +388,17 @@ def do_logout():
     if 'wants_url' in session:
         del session['wants_url']
 
+def log_out_deleted_user():
+    """Log out the session's user if their row is gone and return a redirect to log in, else None.  Another worker can delete a
+    user that this worker still has cached, so routes writing rows for the user check this when the write fails."""
+    user_id = session.get('user')
+    if user_id is None or db.session.query(User.query.filter_by(id=user_id).exists()).scalar():
+        return None
+    user_cache.invalidate(user_id)
+    do_logout()
+    flash("Access unauthorized.  Please log in first to view this page.", "danger")
+    return redirect(url_for("login"))
+
 ###################################################################################################
 # User Register/Log In/Log Out Routes
 ###################################################################################################
@@ -198,9 +452,15 @@ def login():
         username = form.username.data
         password = form.password.data
         
+        if login_throttle.is_throttled(username):
+            flash('Too many failed log in attempts.  Please wait a few minutes and try again.', 'danger')
+            return render_template('/users/login.html', form=form)
+        
         user = User.authenticate(username, password)
         
+        # Only failed log ins count towards the throttle, not mistyped passwords on the edit and delete pages.
         if user:
+            login_throttle.reset(username)
             do_login(user)
             flash(f'Login succesful!  Welcome back {user.username}!', 'success')
             if 'wants_url' in session:
@@ -208,6 +468,7 @@ def login():
             else:
                 return redirect(url_for('user_show'))
         else:
+            login_throttle.record_failure(username)
             flash('Invalid username or password.  Please try again.', 'danger')
         
     return render_template('/users/login.html', form=form)
@@ -224,11 +485,20 @@ def logout():
 # User Routes
 ###################################################################################################
 
+PAGE_SIZES = [10, 25, 50, 100]
+
 @app.route('/user')
 @check_if_authorized
 def user_show():
-    """Show details for user."""
-    return render_template('users/show.html', user=g.user, files=g.user.pdfs)
+    """Show details for user.  Worksheets and files are listed newest first, a page at a time."""
+    per_page = request.args.get('per_page', 25, type=int)
+    per_page = min(max(per_page, 1), PAGE_SIZES[-1])
+    
+    jobs = SaveJob.query.filter(SaveJob.user_id == g.user.id, SaveJob.status.in_(['queued', 'running'])).all()
+    worksheets = paginate(Worksheet.query.filter_by(user_id=g.user.id), Worksheet, request.args.get('worksheets_before'), per_page)
+    # Pdfs rendered ahead of time for a saved worksheet are downloaded from the worksheet, so only list older pdfs as files.
+    files = paginate(PDF.query.filter(PDF.user_id == g.user.id, PDF.worksheet_id.is_(None)), PDF, request.args.get('files_before'), per_page)
+    return render_template('users/show.html', user=g.user, worksheets=worksheets, files=files, jobs=jobs, per_page=per_page, page_sizes=PAGE_SIZES)
     
 @app.route('/user/edit', methods=['GET', 'POST'])
 @check_if_authorized
@@ -255,6 +525,7 @@ def user_edit():
                 
                 db.session.add(user)
                 db.session.commit()
+                user_cache.invalidate(user.id)
                 
                 flash("Account successfully updated.", "success")
                 return redirect(url_for("user_show"))
@@ -269,6 +540,9 @@ def user_edit():
                 
                 return render_template('/users/edit.html', form=form, user=g.user)
             
+        deleted = log_out_deleted_user()
+        if deleted:
+            return deleted
         flash("Invalid password.  Please make sure your password is correct.", 'danger')
     
     return render_template('users/edit.html', form=form, user=g.user)
@@ -292,9 +566,19 @@ def user_delete():
         
         if user:            
             try:
+                keys = [pdf.unique_s3_filename for pdf in g.user.pdfs]
+                user_id = g.user.id
                 do_logout()
                 db.session.delete(g.user)
                 db.session.commit()
+                user_cache.invalidate(user_id)
+                
+                # Remove the user's files from storage in the background.  If the queue is full, reconciliation will remove them later.
+                if keys:
+                    try:
+                        cleanup_queue.enqueue(keys)
+                    except JobQueueFull:
+                        logger.warning('Cleanup queue full, leaving %s stored files for reconciliation', len(keys))
                 
                 flash("Account successfully deleted.", "success")
                 return redirect(url_for("index"))
@@ -304,91 +588,302 @@ def user_delete():
                 flash("Something went wrong.  Could not delete your account.", "danger")                
                 return render_template('/users/delete.html', form=form, user=g.user)
             
+        deleted = log_out_deleted_user()
+        if deleted:
+            return deleted
         flash("Invalid password.  Please make sure your password is correct.", 'danger')
     
     return render_template('users/delete.html', form=form, user=g.user)
 
 ###################################################################################################
-# Worksheet S3 Cloud Storage Routes
+# Worksheet Cloud Storage Routes
 ###################################################################################################
 @app.route('/upload', methods=['GET', 'POST'])
 @check_session_questions
 @check_if_authorized
 def upload():
-    """Upload worksheet and answer key to S3 bucket."""
+    """Save the worksheet questions.  The worksheet and answer key pdfs are rendered from them when downloaded."""
     
     if request.method == 'GET':
         return redirect(url_for('new_worksheet_detail'))
     
-    user = User.query.get(session['user'])
-    
-    worksheet_html = render_template('worksheet.html', questions=session['questions'], render=True)
-    answer_key_html = render_template('answer-key.html', questions=session['questions'], render=True)
+    draft = get_draft()
+    # Keep the layout of the preview the user saved.
+    template_version = RENDERERS[get_renderer()]
+    worksheet = Worksheet.create_new_worksheet(user_id=g.user.id, name=draft.name, questions=draft.get_questions(), template_version=template_version)
+    try:
+        db.session.add(worksheet)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        deleted = log_out_deleted_user()
+        if deleted:
+            return deleted
+        raise
     
-    new_worksheet = PDF.create_new_pdf(user_id=user.id, filename=f'{session.get("name")} - Worksheet.pdf', sheet_type='worksheet')
-    new_answer_key = PDF.create_new_pdf(user_id=user.id, filename=f'{session.get("name")} - Answer Key.pdf', sheet_type='answer key')
+    job = None
+    if MATERIALIZE_PDFS:
+        # Also render the pdfs and keep them in storage, in the background.
+        job = SaveJob.create_new_job(user_id=worksheet.user_id, name=worksheet.name)
+        try:
+            db.session.add(job)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            deleted = log_out_deleted_user()
+            if deleted:
+                return deleted
+            raise
+        
+        try:
+            save_queue.enqueue(job.id, worksheet.id)
+        except JobQueueFull:
+            db.session.delete(job)
+            db.session.commit()
+            job = None
     
-    worksheet_filename = new_worksheet.unique_s3_filename
-    answer_key_filename = new_answer_key.unique_s3_filename
-    worksheet_path = f'pdfs-for-upload/{worksheet_filename}'
-    answer_key_path = f'pdfs-for-upload/{answer_key_filename}'
+    if request.accept_mimetypes.best == 'application/json':
+        if job:
+            return jsonify(worksheet=worksheet.serialize(), job=job.serialize(), status_url=url_for('upload_status', job_id=job.id)), 201
+        return jsonify(worksheet=worksheet.serialize()), 201
     
-    HTML(string=worksheet_html).write_pdf(worksheet_path)
-    HTML(string=answer_key_html).write_pdf(answer_key_path)
+    flash("Worksheet and answer key successfully saved!", "success")
+    return redirect(url_for('user_show'))
 
-    # Get bucket object
-    my_bucket = get_bucket()
-    # Pass in file names and upload to Bucket
-    my_bucket.upload_file(worksheet_path, worksheet_filename)
-    my_bucket.upload_file(answer_key_path, answer_key_filename)
-    # Remove files from file system after upload to S3
-    os.remove(worksheet_path)
-    os.remove(answer_key_path)
+@app.route('/upload/<job_id>')
+@check_if_authorized
+def upload_status(job_id):
+    """Show the status of a save job as JSON."""
+    job = SaveJob.query.filter_by(id=job_id, user_id=g.user.id).first()
     
-    # Save worksheet metadata to db.
-    db.session.add_all([new_worksheet, new_answer_key])
-    db.session.commit()
+    if not job:
+        return jsonify(message='Save job not found.'), 404
     
-    flash("Worksheet and answer key successfully saved!", "success")
-    return redirect(url_for('user_show'))
+    return jsonify(job=job.serialize())
 
 @app.route('/delete', methods=['POST'])
 @check_if_authorized
 def delete():
-    """Delete pdf file from S3 bucket."""
-    # Get the file key from hidden field in delete form.
-    key = request.form['key']
-
-    my_bucket = get_bucket()
-    # Delete the appropriate file using the key.
-    my_bucket.Object(key).delete()
+    """Delete saved worksheets and pdf files from storage."""
+    # Get the worksheet ids and file keys from the hidden field in delete form or the checkboxes in the bulk delete form.
+    worksheet_ids = [int(worksheet_id) for worksheet_id in request.form.getlist('worksheet_id') if worksheet_id.isdigit()]
+    keys = request.form.getlist('key')
+    
+    # Only delete worksheets and files that belong to the user.
+    worksheets = Worksheet.query.filter( (Worksheet.user_id == g.user.id) & (Worksheet.id.in_(worksheet_ids))).all()
+    pdfs = PDF.query.filter( (PDF.user_id == g.user.id) & (PDF.unique_s3_filename.in_(keys))).all()
+    if not worksheets and not pdfs:
+        flash('Please select a file to delete.', 'warning')
+        return redirect(url_for('user_show'))
+    
+    # Delete the files, and any pdfs stored for the worksheets, in as few calls to storage as possible.
+    stored_keys = [pdf.unique_s3_filename for pdf in pdfs + [pdf for worksheet in worksheets for pdf in worksheet.pdfs]]
+    failed = set(get_storage().delete_many(stored_keys)) if stored_keys else set()
     
     # Delete worksheet metadata from db.
-    pdf = PDF.query.filter( (PDF.user_id == g.user.id) & (PDF.unique_s3_filename == key)).first()
-    db.session.delete(pdf)
+    for pdf in pdfs:
+        if pdf.unique_s3_filename not in failed:
+            db.session.delete(pdf)
+    for worksheet in worksheets:
+        if not any(pdf.unique_s3_filename in failed for pdf in worksheet.pdfs):
+            db.session.delete(worksheet)
     db.session.commit()
     
-    flash('File deleted successfully.', 'success')
+    total = len(worksheets) + len(pdfs)
+    if failed:
+        flash(f'Some of the {total} selected files could not be deleted.  Please try again.', 'danger')
+    elif total == 1:
+        flash('File deleted successfully.', 'success')
+    else:
+        flash(f'{total} files deleted successfully.', 'success')
     return redirect(url_for('user_show'))
 
-@app.route('/download', methods=['POST'])
+@app.route('/worksheets/<int:worksheet_id>/<sheet>.pdf')
+@check_if_authorized
+def worksheet_pdf(worksheet_id, sheet):
+    """Download the worksheet or answer key pdf for a saved worksheet.  Uses the stored pdf if there is one, otherwise renders it through the pdf cache."""
+    worksheet = Worksheet.query.filter_by(id=worksheet_id, user_id=g.user.id).first()
+    if not worksheet or sheet not in SHEET_TYPES:
+        abort(404)
+    
+    sheet_type = sheet.replace('-', ' ')
+    stored = next((pdf for pdf in worksheet.pdfs if pdf.sheet_type == sheet_type), None)
+    if stored:
+        return redirect(url_for('download', key=stored.unique_s3_filename))
+    
+    questions = worksheet.get_questions()
+    renderer = get_renderer(get_saved_renderer(worksheet.template_version))
+    try:
+        pdf = render_sheet_pdf(sheet, questions, request.url, renderer)
+    except RENDER_UNAVAILABLE:
+        abort(503)
+    
+    filename = f'{worksheet.name} - {sheet_type.title()}.pdf'
+    response = Response(pdf, mimetype='application/pdf', headers={"Content-Disposition": content_disposition(filename)})
+    response.set_etag(get_cache_key(sheet, questions, RENDERERS[renderer]))
+    return response.make_conditional(request, accept_ranges=True, complete_length=len(pdf))
+
+@app.route('/download', methods=['GET', 'POST'])
 @check_if_authorized
 def download():
-    """Download pdf file from S3 bucket."""
-    # Get the file key and filename from hidden field in delete form.
-    key = request.form['key']
-    filename = request.form['filename']
+    """Download pdf file from storage.  The file is streamed in chunks and supports HTTP range requests."""
+    # Get the file key from hidden field in download form or from the query string.
+    key = request.values['key']
+    
+    # Only let users download their own files.
+    pdf = PDF.query.filter( (PDF.user_id == g.user.id) & (PDF.unique_s3_filename == key)).first()
+    if not pdf:
+        abort(404)
+    
+    storage = get_storage()
+    
+    if S3_PRESIGNED_DOWNLOADS:
+        url = storage.presigned_url(key, pdf.filename)
+        if url:
+            return redirect(url)
+    
+    # Get file object, passing on the range and etag headers.
+    try:
+        stored = storage.open(key, byte_range=request.headers.get('Range'), if_none_match=request.headers.get('If-None-Match'))
+    except NotModified as error:
+        return Response(status=304, headers={"ETag": error.etag})
+    except InvalidRange as error:
+        return Response(status=416, headers={"Content-Range": f"bytes */{error.size}"})
+    except ObjectNotFound:
+        abort(404)
     
-    my_bucket = get_bucket()
-    # Get file object
-    file_obj = my_bucket.Object(key).get()
+    headers = {
+        "Content-Disposition": content_disposition(pdf.filename),
+        "Content-Length": str(stored.content_length),
+        "Accept-Ranges": "bytes",
+        "ETag": stored.etag,
+    }
+    if stored.content_range:
+        headers["Content-Range"] = stored.content_range
     
     return Response(
-        file_obj['Body'].read(), 
+        stored.body, 
+        status=206 if stored.content_range else 200,
         mimetype='application/pdf', 
-        headers={"Content-Disposition": f'attachment; filename="{format(filename)}"'}
+        headers=headers,
+        direct_passthrough=True,
         )
     
+###################################################################################################
+# CLI Commands
+###################################################################################################
+@app.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create missing tables and add new columns and indexes to an existing database, keeping its data."""
+    upgrade_db()
+    click.echo('Database is up to date.')
+
+@app.cli.command('reconcile-storage')
+@click.option('--dry-run', is_flag=True, help='List orphaned files without deleting them.')
+def reconcile_storage(dry_run):
+    """Delete stored files that no saved worksheet refers to."""
+    known_keys = [key for (key,) in db.session.query(PDF.unique_s3_filename)]
+    orphans = find_orphaned_keys(known_keys)
+    
+    for key in orphans:
+        click.echo(key)
+    if dry_run or not orphans:
+        click.echo(f'Found {len(orphans)} orphaned files.')
+        return
+    
+    failed = purge_keys(orphans)
+    click.echo(f'Deleted {len(orphans) - len(failed)} of {len(orphans)} orphaned files.')
+
+@app.cli.command('import-report')
+@click.option('--limit', default=20, help='Number of imports to list.')
+def import_report(limit):
+    """Show how long the app takes to import and which of its imports are slowest."""
+    total, slowest = get_import_report('app', limit)
+    click.echo(f'Importing app takes {total / 1000:.0f} ms.')
+    for name, cumulative_us in slowest:
+        click.echo(f'{cumulative_us / 1000:8.1f} ms  {name}')
+
+@app.cli.command('purge-drafts')
+def purge_drafts():
+    """Delete generated worksheets that were never saved and are older than DRAFT_MAX_AGE."""
+    deleted = Draft.delete_expired(DRAFT_MAX_AGE)
+    db.session.commit()
+    click.echo(f'Deleted {deleted} expired drafts.')
+
+###################################################################################################
+# Metrics
+###################################################################################################
+@app.before_request
+def start_trace():
+    """Start timing the stages of this request."""
+    g.trace = metrics.start_request()
+
+@app.after_request
+def record_status(response):
+    """Keep the response status for the request summary."""
+    if 'trace' in g:
+        g.trace.status = response.status_code
+    return response
+
+@app.teardown_request
+def finish_trace(exc):
+    """Count the request and log a summary line with the time spent in each stage.  Streamed responses are finished once the stream ends."""
+    trace = g.pop('trace', None)
+    if trace is None:
+        return
+    status = 500 if exc is not None else trace.status
+    seconds = metrics.finish_request(trace, request.endpoint, status)
+    logger.info('%s %s %s in %.1f ms: %s', request.method, request.path, status, seconds * 1000, trace.summary() or 'no stages timed')
+
+def has_bearer_token(token):
+    """Does the request have an Authorization header with token as its bearer token?"""
+    return hmac.compare_digest(request.headers.get('Authorization', '').encode('utf8'), f'Bearer {token}'.encode('utf8'))
+
+@app.route('/metrics')
+def show_metrics():
+    """Show request and stage timings for this worker in the Prometheus text format.  Needs a bearer token when METRICS_TOKEN is set."""
+    if METRICS_TOKEN and not has_bearer_token(METRICS_TOKEN):
+        abort(401)
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+###################################################################################################
+# Profiling
+###################################################################################################
+@app.before_request
+def start_profile():
+    """Sample this request's stack while it runs if its route is profiled.  Only checks a flag when profiling is off."""
+    if profiler.enabled and profiler.should_profile(request.endpoint):
+        g.profiled = True
+        profiler.start(request.endpoint)
+
+@app.teardown_request
+def stop_profile(exc):
+    """Stop sampling this request's stack."""
+    if g.pop('profiled', False):
+        profiler.stop()
+
+@app.route('/profile', methods=['GET', 'DELETE'])
+@csrf.exempt
+def show_profile():
+    """Show the stacks sampled in this worker in the collapsed format flame graph tools read, for every endpoint or ?endpoint=.  DELETE forgets them.  Only served when PROFILE_TOKEN is set and sent as the bearer token."""
+    if not PROFILE_TOKEN:
+        abort(404)
+    if not has_bearer_token(PROFILE_TOKEN):
+        abort(401)
+    if request.method == 'DELETE':
+        profiler.clear()
+        return '', 204
+    return Response(profiler.collapsed(request.args.get('endpoint')), content_type='text/plain; charset=utf-8')
+
+###################################################################################################
+# Error Handlers
+###################################################################################################
+@app.errorhandler(PasswordQueueFull)
+def password_queue_full(e):
+    """Send the user back to the form when too many passwords are being checked at once."""
+    flash('Too many people are logging in right now.  Please try again in a moment.', 'danger')
+    return redirect(request.url, code=303)
+
 ###################################################################################################
 # 404 Route
 ###################################################################################################
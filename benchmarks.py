@@ -0,0 +1,328 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+QUESTION_COUNTS = [5, 15, 30]
+SHEET_COUNTS = [0, 100, 1000]
+SHEETS = ['worksheet', 'answer-key']
+PARAMS = {'min': 0, 'max': 100}
+
+def measure(function, repeat=5, warmup=1, setup=None):
+    """Time function over repeat runs after warmup untimed runs.  setup is called before each run, untimed, and its result is passed to function."""
+    times = []
+    for i in range(warmup + repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        function(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        if i >= warmup:
+            times.append(elapsed)
+    return {
+        'runs': len(times),
+        'min_ms': round(min(times), 3),
+        'median_ms': round(statistics.median(times), 3),
+        'mean_ms': round(statistics.mean(times), 3),
+        'max_ms': round(max(times), 3),
+        }
+
+def result(name, params, timings):
+    """One benchmark result for the json output."""
+    return {'name': name, 'params': params, **timings}
+
+def result_key(entry):
+    """Key matching the same benchmark between two runs."""
+    return entry['name'], json.dumps(entry['params'], sort_keys=True)
+
+def compare_results(baseline, current, threshold=0.2):
+    """Find benchmarks whose median got more than threshold slower than in the baseline run.  Returns (name, params, before_ms, after_ms) tuples."""
+    before = {result_key(entry): entry for entry in baseline['results'] if 'median_ms' in entry}
+    regressions = []
+    for entry in current['results']:
+        old = before.get(result_key(entry))
+        if old is None or 'median_ms' not in entry:
+            continue
+        if entry['median_ms'] > old['median_ms'] * (1 + threshold):
+            regressions.append((entry['name'], entry['params'], old['median_ms'], entry['median_ms']))
+    return regressions
+
+def get_weasyprint_error():
+    """Why WeasyPrint can't be used here, or None if it can.  It needs system libraries that aren't always installed."""
+    try:
+        import weasyprint
+    except (ImportError, OSError) as e:
+        return str(e).splitlines()[0]
+    return None
+
+def get_git_commit():
+    """Commit the benchmarks ran at, or None outside a git checkout."""
+    try:
+        output = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+def log(message):
+    print(message, file=sys.stderr)
+
+###################################################################################################
+# Benchmarks
+###################################################################################################
+
+def bench_questions(api_url, counts, repeat):
+    """Fetch questions from the math api stand-in, and generate them locally for comparison."""
+    from api_helpers import get_math_data, run_in_loop
+    from question_generator import generate_questions
+
+    results = []
+    for count in counts:
+        timings = measure(lambda: run_in_loop(get_math_data(api_url, 'random', count, PARAMS)), repeat)
+        results.append(result('questions.api', {'questions': count}, timings))
+        timings = measure(lambda: generate_questions('random', count, PARAMS), repeat)
+        results.append(result('questions.local', {'questions': count}, timings))
+    return results
+
+def bench_templates(app, counts, repeat):
+    """Render the html for each sheet."""
+    from flask import render_template
+    from question_generator import generate_questions
+
+    results = []
+    with app.test_request_context():
+        for count in counts:
+            questions = generate_questions('random', count, PARAMS)
+            for sheet in SHEETS:
+                timings = measure(lambda: render_template(f'{sheet}.html', questions=questions, render=True), repeat)
+                results.append(result('template', {'sheet': sheet, 'questions': count}, timings))
+    return results
+
+def bench_pdfs(app, counts, repeat):
+    """Render each sheet to pdf with every renderer, without the pdf cache.  WeasyPrint is skipped when it can't be loaded."""
+    from flask import render_template
+    from grid_pdf import write_sheet_pdf
+    from question_generator import generate_questions
+    from render_service import write_pdf
+
+    weasyprint_error = get_weasyprint_error()
+    results = []
+    with app.test_request_context():
+        for count in counts:
+            questions = generate_questions('random', count, PARAMS)
+            for sheet in SHEETS:
+                params = {'sheet': sheet, 'questions': count}
+                results.append(result('pdf.grid', params, measure(lambda: write_sheet_pdf(sheet, questions), repeat)))
+                if weasyprint_error:
+                    results.append(result('pdf.weasyprint', params, {'skipped': weasyprint_error}))
+                    continue
+                html = render_template(f'{sheet}.html', questions=questions, render=True)
+                results.append(result('pdf.weasyprint', params, measure(lambda: write_pdf(html), repeat)))
+    return results
+
+def create_user(name):
+    """Add a user for a benchmark.  Benchmark users are thrown away, so their passwords are hashed cheaply."""
+    from models import db, User
+    from passwords import PasswordHasher
+
+    user = User(username=name, password=PasswordHasher(rounds=4, workers=0).hash('BenchmarkPassword123'), email=f'{name}@example.com')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def log_in(client, user_id, draft_id=None):
+    """Log the test client in, without checking a password."""
+    with client.session_transaction() as session:
+        session['user'] = user_id
+        if draft_id:
+            session['draft'] = draft_id
+
+def bench_upload(app, counts, repeat):
+    """Save a draft worksheet through the /upload route."""
+    from models import db, Draft
+    from question_generator import generate_questions
+
+    results = []
+    for count in counts:
+        with app.app_context():
+            user_id = create_user(f'upload{count}')
+            draft = Draft.create_new_draft('Benchmark', generate_questions('random', count, PARAMS))
+            db.session.add(draft)
+            db.session.commit()
+            draft_id = draft.id
+
+        with app.test_client() as client:
+            log_in(client, user_id, draft_id)
+
+            def upload():
+                response = client.post('/upload')
+                assert response.status_code == 302, response.status_code
+
+            results.append(result('route.upload', {'questions': count}, measure(upload, repeat)))
+    return results
+
+def bench_save(app, counts, repeat):
+    """Render a saved worksheet's pdfs and put them in storage, like a save worker does.  Each run saves new questions, so the pdf cache is missed."""
+    from app import save_worksheet
+    from models import db, SaveJob, Worksheet
+    from question_generator import generate_questions
+
+    results = []
+    with app.app_context():
+        user_id = create_user('saver')
+    for count in counts:
+        def setup():
+            with app.app_context():
+                worksheet = Worksheet.create_new_worksheet(user_id, 'Benchmark', generate_questions('random', count, PARAMS), 'benchmark')
+                job = SaveJob.create_new_job(user_id=user_id, name='Benchmark')
+                db.session.add_all([worksheet, job])
+                db.session.commit()
+                return job.id, worksheet.id
+
+        results.append(result('save_worksheet', {'questions': count}, measure(save_worksheet, repeat, setup=setup)))
+    return results
+
+def add_saved_sheets(user_id, count):
+    """Give a user count saved worksheets and count older pdf files, a minute apart."""
+    from models import db, PDF, Worksheet
+    from question_generator import generate_questions
+
+    questions = generate_questions('random', 15, PARAMS)
+    start = datetime.utcnow() - timedelta(minutes=count)
+    worksheets = []
+    files = []
+    for i in range(count):
+        timestamp = start + timedelta(minutes=i)
+        worksheet = Worksheet.create_new_worksheet(user_id, f'Worksheet {i}', questions, 'benchmark')
+        worksheet.timestamp = timestamp
+        worksheets.append(worksheet)
+        pdf = PDF.create_new_pdf(user_id, f'File {i} - Worksheet.pdf', 'worksheet')
+        pdf.timestamp = timestamp
+        files.append(pdf)
+    db.session.add_all(worksheets + files)
+    db.session.commit()
+
+def bench_user_listing(app, sheet_counts, repeat, per_page=25):
+    """List a user's saved worksheets and files on /user, on the first page and from the middle of the list."""
+    from models import Worksheet
+    from pagination import encode_cursor
+
+    results = []
+    for count in sheet_counts:
+        with app.app_context():
+            user_id = create_user(f'lister{count}')
+            add_saved_sheets(user_id, count)
+            middle = Worksheet.query.filter_by(user_id=user_id).order_by(Worksheet.timestamp).offset(count // 2).first()
+            cursor = encode_cursor(middle) if middle else None
+
+        with app.test_client() as client:
+            log_in(client, user_id)
+            pages = {'first': f'/user?per_page={per_page}'}
+            if cursor:
+                pages['middle'] = f'/user?per_page={per_page}&worksheets_before={cursor}&files_before={cursor}'
+            for page, url in pages.items():
+                def show():
+                    response = client.get(url)
+                    assert response.status_code == 200, response.status_code
+
+                results.append(result('route.user', {'sheets': count, 'page': page, 'per_page': per_page}, measure(show, repeat)))
+    return results
+
+###################################################################################################
+# Running
+###################################################################################################
+
+def run(database_url, storage_name, question_counts, sheet_counts, repeat, api_latency):
+    """Run every benchmark against a local stand-in for the math api, a local store for pdfs and database_url.  Returns the results as a dict."""
+    from fake_math_api import FakeMathAPI
+    from storage import LocalStorage, MemoryStorage, set_storage
+
+    from app import app
+    from models import db
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_ECHO'] = False
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with tempfile.TemporaryDirectory() as directory:
+        set_storage(LocalStorage(os.path.join(directory, 'storage')) if storage_name == 'local' else MemoryStorage())
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+
+        results = []
+        with FakeMathAPI(latency=api_latency) as api:
+            log(f'Fetching questions from {api.url}')
+            results += bench_questions(api.url, question_counts, repeat)
+        log('Rendering templates')
+        results += bench_templates(app, question_counts, repeat)
+        log('Rendering pdfs')
+        results += bench_pdfs(app, question_counts, repeat)
+        log('Saving worksheets')
+        results += bench_upload(app, question_counts, repeat)
+        results += bench_save(app, question_counts, repeat)
+        log('Listing saved worksheets')
+        results += bench_user_listing(app, sheet_counts, repeat)
+
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    return {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(),
+            'commit': get_git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': database_url.split(':', 1)[0],
+            'storage': storage_name,
+            'repeat': repeat,
+            'api_latency': api_latency,
+            },
+        'results': results,
+        }
+
+def parse_counts(value):
+    return [int(count) for count in value.split(',') if count]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the worksheet pipeline against local stand-ins and print the results as json.')
+    parser.add_argument('--database-url', help='Database to benchmark against.  Its tables are dropped and created again.  Defaults to a temporary SQLite file.')
+    parser.add_argument('--storage', choices=['local', 'memory'], default='local', help='Where saved pdfs are put.')
+    parser.add_argument('--questions', type=parse_counts, default=QUESTION_COUNTS, help='Comma separated question counts.')
+    parser.add_argument('--sheets', type=parse_counts, default=SHEET_COUNTS, help='Comma separated saved worksheet counts for /user.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs of each benchmark.')
+    parser.add_argument('--api-latency', type=float, default=0, help='Seconds the math api stand-in waits before each response.')
+    parser.add_argument('--output', help='File to write the json to instead of stdout.')
+    parser.add_argument('--compare', help='Json from an earlier run.  Exits with status 1 if a benchmark got slower than it by more than --threshold.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Slowdown allowed by --compare, as a fraction of the earlier median.')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = args.database_url or f'sqlite:///{os.path.join(directory, "benchmarks.db")}'
+        report = run(database_url, args.storage, args.questions, args.sheets, args.repeat, args.api_latency)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = compare_results(baseline, report, args.threshold)
+        for name, params, before_ms, after_ms in regressions:
+            log(f'{name} {json.dumps(params, sort_keys=True)} got slower: {before_ms:.1f} ms -> {after_ms:.1f} ms')
+        if regressions:
+            return 1
+        log('No benchmarks got slower.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from config import ORPHAN_GRACE_PERIOD, CLEANUP_QUEUE_DEPTH
+from job_queue import JobQueue
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+def purge_keys(keys):
+    """Delete keys from storage, logging any that could not be deleted so reconciliation can pick them up later."""
+    failed = get_storage().delete_many(keys)
+    if failed:
+        logger.warning('Could not delete %s of %s stored files', len(failed), len(keys))
+    return failed
+
+# Background reaper for the stored files of deleted users.
+cleanup_queue = JobQueue(purge_keys, workers=1, max_size=CLEANUP_QUEUE_DEPTH, name='cleanup-worker')
+
+def find_orphaned_keys(known_keys, objects=None, grace_period=ORPHAN_GRACE_PERIOD, now=None):
+    """Find stored keys that no PDF row refers to.  Objects newer than the grace period are skipped since they may belong to a save that is still running."""
+    if objects is None:
+        objects = get_storage().list()
+    if now is None:
+        now = datetime.now(timezone.utc)
+    cutoff = now - timedelta(seconds=grace_period)
+    known_keys = set(known_keys)
+    return [obj['Key'] for obj in objects if obj['Key'] not in known_keys and obj['LastModified'] < cutoff]
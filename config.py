@@ -2,4 +2,108 @@ from os import environ
 
 S3_BUCKET = environ.get('S3_BUCKET')
 S3_KEY = environ.get('S3_KEY')
-S3_SECRET = environ.get('S3_SECRET')
\ No newline at end of file
+S3_SECRET = environ.get('S3_SECRET')
+
+# Where saved pdfs are kept: 's3', 'local' for files in LOCAL_STORAGE_DIR, or 'memory' for tests and benchmarks.
+STORAGE_BACKEND = environ.get('STORAGE_BACKEND', 's3')
+LOCAL_STORAGE_DIR = environ.get('LOCAL_STORAGE_DIR', 'storage')
+
+# S3 connection pool, retries and timeouts in seconds.
+S3_MAX_POOL_CONNECTIONS = int(environ.get('S3_MAX_POOL_CONNECTIONS', 10))
+S3_MAX_ATTEMPTS = int(environ.get('S3_MAX_ATTEMPTS', 3))
+S3_CONNECT_TIMEOUT = float(environ.get('S3_CONNECT_TIMEOUT', 5))
+S3_READ_TIMEOUT = float(environ.get('S3_READ_TIMEOUT', 30))
+
+# Downloads are streamed from S3 in chunks, or with S3_PRESIGNED_DOWNLOADS redirected to a presigned S3 url.
+DOWNLOAD_CHUNK_SIZE = int(environ.get('DOWNLOAD_CHUNK_SIZE', 64 * 1024))
+S3_PRESIGNED_DOWNLOADS = environ.get('S3_PRESIGNED_DOWNLOADS', '0') == '1'
+S3_PRESIGNED_EXPIRES = int(environ.get('S3_PRESIGNED_EXPIRES', 60))
+
+# Cleanup of S3 objects for deleted users, and how old in seconds an object without a PDF row must be to count as orphaned.
+CLEANUP_QUEUE_DEPTH = int(environ.get('CLEANUP_QUEUE_DEPTH', 100))
+ORPHAN_GRACE_PERIOD = int(environ.get('ORPHAN_GRACE_PERIOD', 3600))
+
+# Math questions are generated in process by default.  Set QUESTION_SOURCE to 'api' to call the math api instead.
+API_BASE_URL = environ.get('API_BASE_URL', "https://web-production-a407.up.railway.app")
+QUESTION_SOURCE = environ.get('QUESTION_SOURCE', 'local')
+MATH_API_FALLBACK = environ.get('MATH_API_FALLBACK', '0') == '1'
+
+# Connection pool for the math api client session shared by each worker.
+MATH_API_CONNECTION_LIMIT = int(environ.get('MATH_API_CONNECTION_LIMIT', 100))
+MATH_API_DNS_CACHE_TTL = int(environ.get('MATH_API_DNS_CACHE_TTL', 300))
+MATH_API_KEEPALIVE_TIMEOUT = float(environ.get('MATH_API_KEEPALIVE_TIMEOUT', 30))
+
+# Limits for the math api fan-out.  Timeouts and delays are in seconds, a hedge delay of 0 turns hedging off.
+MATH_API_CONCURRENCY = int(environ.get('MATH_API_CONCURRENCY', 10))
+MATH_API_REQUEST_TIMEOUT = float(environ.get('MATH_API_REQUEST_TIMEOUT', 2))
+MATH_API_DEADLINE = float(environ.get('MATH_API_DEADLINE', 5))
+MATH_API_RETRIES = int(environ.get('MATH_API_RETRIES', 2))
+MATH_API_RETRY_BACKOFF = float(environ.get('MATH_API_RETRY_BACKOFF', 0.1))
+MATH_API_HEDGE_DELAY = float(environ.get('MATH_API_HEDGE_DELAY', 0.5))
+
+# Pool of ready-made questions for each combination of worksheet parameters.
+QUESTION_POOL_ENABLED = environ.get('QUESTION_POOL_ENABLED', '1') == '1'
+QUESTION_POOL_SIZE = int(environ.get('QUESTION_POOL_SIZE', 120))
+QUESTION_POOL_MAX_KEYS = int(environ.get('QUESTION_POOL_MAX_KEYS', 32))
+
+# Cache for rendered pdfs.  Set PDF_CACHE_DIR to share rendered pdfs between workers on disk.
+PDF_CACHE_MAX_BYTES = int(environ.get('PDF_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+PDF_CACHE_DIR = environ.get('PDF_CACHE_DIR')
+PDF_CACHE_DISK_MAX_BYTES = int(environ.get('PDF_CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
+
+# Process pool for rendering pdfs with WeasyPrint.  Set RENDER_WORKERS to 0 to render in the web worker instead.
+RENDER_WORKERS = int(environ.get('RENDER_WORKERS', 2))
+RENDER_QUEUE_DEPTH = int(environ.get('RENDER_QUEUE_DEPTH', 8))
+RENDER_QUEUE_TIMEOUT = float(environ.get('RENDER_QUEUE_TIMEOUT', 5))
+RENDER_TIMEOUT = float(environ.get('RENDER_TIMEOUT', 60))
+
+# Saved worksheets only store their questions.  Set MATERIALIZE_PDFS to also render and store their pdfs in the background.
+MATERIALIZE_PDFS = environ.get('MATERIALIZE_PDFS', '0') == '1'
+
+# Background threads that render and store saved worksheets.
+SAVE_WORKERS = int(environ.get('SAVE_WORKERS', 2))
+SAVE_QUEUE_DEPTH = int(environ.get('SAVE_QUEUE_DEPTH', 32))
+
+# Seconds an unsaved worksheet is kept before `flask purge-drafts` removes it.
+DRAFT_MAX_AGE = int(environ.get('DRAFT_MAX_AGE', 24 * 60 * 60))
+
+# Per worker cache of logged in users, so most requests don't look the user up in the db.  Set USER_CACHE_TTL to 0 to turn it off.
+# Edits and deletes only clear the cache of the worker that made them, so other workers can show a user's old details for up to
+# USER_CACHE_TTL seconds.  A deleted user is logged out once a write for them fails.
+USER_CACHE_TTL = float(environ.get('USER_CACHE_TTL', 60))
+USER_CACHE_MAX_SIZE = int(environ.get('USER_CACHE_MAX_SIZE', 1024))
+
+# bcrypt cost factor for passwords, and the threads per web worker that hash them.  Passwords are rehashed on login when the cost changes.
+BCRYPT_ROUNDS = int(environ.get('BCRYPT_ROUNDS', 12))
+PASSWORD_WORKERS = int(environ.get('PASSWORD_WORKERS', 2))
+PASSWORD_QUEUE_DEPTH = int(environ.get('PASSWORD_QUEUE_DEPTH', 16))
+PASSWORD_QUEUE_TIMEOUT = float(environ.get('PASSWORD_QUEUE_TIMEOUT', 5))
+
+# Failed logins allowed per username within LOGIN_FAILURE_WINDOW seconds before it is locked out.  Set LOGIN_MAX_FAILURES to 0 to turn this off.
+LOGIN_MAX_FAILURES = int(environ.get('LOGIN_MAX_FAILURES', 5))
+LOGIN_FAILURE_WINDOW = float(environ.get('LOGIN_FAILURE_WINDOW', 300))
+
+# Most versions of a worksheet that can be generated at once for a class set.
+CLASS_SET_MAX_VARIANTS = int(environ.get('CLASS_SET_MAX_VARIANTS', 40))
+
+# How pdfs are rendered unless a request asks for another renderer with ?renderer=.  grid writes the worksheet layout
+# straight to pdf, weasyprint renders the html templates on the render pool.
+PDF_RENDERER = environ.get('PDF_RENDERER', 'grid')
+
+# Log every SQL statement.  Query times are in /metrics and the request summary logs without this.
+SQL_ECHO = environ.get('SQL_ECHO', '0') == '1'
+
+# Bearer token that /metrics asks for.  Leave it unset when /metrics is only reachable from inside the network.
+METRICS_TOKEN = environ.get('METRICS_TOKEN')
+
+# Sampling profiler.  Requests to the endpoints in PROFILE_ROUTES, like 'render_new_pdf,upload', are always profiled and
+# a PROFILE_SAMPLE_RATE fraction of other requests.  Their stacks can be fetched from /profile with PROFILE_TOKEN.
+PROFILE_ROUTES = [route for route in environ.get('PROFILE_ROUTES', '').split(',') if route]
+PROFILE_SAMPLE_RATE = float(environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL = float(environ.get('PROFILE_INTERVAL', 0.005))
+PROFILE_MAX_STACKS = int(environ.get('PROFILE_MAX_STACKS', 2000))
+PROFILE_TOKEN = environ.get('PROFILE_TOKEN')
+
+# Threads per gunicorn worker.  Above 1 gunicorn uses threaded workers, so a worker keeps serving other requests while
+# one waits on the math api, S3 or the render pool.  Each thread can hold a db connection.
+WEB_THREADS = int(environ.get('WEB_THREADS', 8))
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import threading
+
+from aiohttp import web
+
+from question_generator import generate_questions
+
+def create_app(latency=0):
+    """Math api stand-in that answers GET /<operations> with one question, like the real api.  latency seconds are added to each response."""
+    async def question(request):
+        if latency:
+            await asyncio.sleep(latency)
+        try:
+            questions = generate_questions(request.match_info['operations'], 1, request.query)
+        except ValueError as e:
+            return web.json_response({'message': str(e)}, status=400)
+        return web.json_response(questions[0])
+
+    app = web.Application()
+    app.router.add_get('/{operations}', question)
+    return app
+
+class FakeMathAPI:
+    """Runs the math api stand-in on its own event loop thread, so code calling the api can be run against it."""
+
+    def __init__(self, latency=0, host='127.0.0.1', port=0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.url = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    def start(self):
+        """Start serving and return the base url.  With a port of 0 a free port is picked."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='fake-math-api', daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(), self._loop).result(timeout=10)
+        return self.url
+
+    async def _start(self):
+        self._runner = web.AppRunner(create_app(self.latency))
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f'http://{self.host}:{port}'
+
+    def stop(self):
+        """Stop serving and shut the event loop thread down."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result(timeout=10)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=10)
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the math api.  Point API_BASE_URL at it.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--latency', type=float, default=0, help='Seconds to wait before each response.')
+    args = parser.parse_args()
+    web.run_app(create_app(args.latency), host=args.host, port=args.port)
@@ -1,6 +1,5 @@
-import arrow
-
 def date_time_format(date_string):
-    """Format datetime from boto to be human-readable."""
+    """Format datetime from boto to be human-readable.  arrow is imported the first time a date is formatted."""
+    import arrow
     dt = arrow.get(date_string)
     return dt.humanize()
\ No newline at end of file
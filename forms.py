@@ -2,6 +2,9 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SelectField, IntegerRangeField, EmailField, IntegerField, BooleanField
 from wtforms.validators import DataRequired, InputRequired, Email, Length, NumberRange
 
+from config import CLASS_SET_MAX_VARIANTS
+from question_generator import OPERAND_LIMIT
+
 class CreateWorksheetForm(FlaskForm):
     """Form for creating a new Worksheet."""
     name = StringField('Worksheet Name', validators=[DataRequired("Please enter a name for your worksheet.")])
@@ -13,10 +16,14 @@ class CreateWorksheetForm(FlaskForm):
         ('div', 'Division'), 
         ])
     number_questions = IntegerRangeField('Number of Questions', validators=[NumberRange(min=5, max=30)])
-    minimum = IntegerField('Number Minimum', validators=[InputRequired("Please enter a minimum number.")])
-    maximum = IntegerField('Number Maximum', validators=[InputRequired("Please enter a maximum number.")])
+    minimum = IntegerField('Number Minimum', validators=[InputRequired("Please enter a minimum number."), NumberRange(min=-OPERAND_LIMIT, max=OPERAND_LIMIT)])
+    maximum = IntegerField('Number Maximum', validators=[InputRequired("Please enter a maximum number."), NumberRange(min=-OPERAND_LIMIT, max=OPERAND_LIMIT)])
     allow_negative = BooleanField('Allow Negative Results for Subtraction')
     
+class ClassSetForm(CreateWorksheetForm):
+    """Form for downloading several versions of a new Worksheet at once."""
+    variants = IntegerField('Number of Versions for a Class Set', default=1, validators=[NumberRange(min=1, max=CLASS_SET_MAX_VARIANTS)])
+    
 class UserRegisterEditForm(FlaskForm):
     """Form for signing up and registering users."""
     username = StringField('Username', validators=[DataRequired("Please enter a username for your account.")])
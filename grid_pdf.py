@@ -0,0 +1,113 @@
+import io
+
+import pydyf
+
+# Bump when the layout changes, so pdfs cached from the old layout aren't reused.
+LAYOUT_VERSION = 2
+
+# The layout copies what WeasyPrint makes of worksheet.html and answer-key.html: an A4 page with its default
+# 75px margins and a Bootstrap container with two columns of questions.  Sizes are CSS pixels turned into points.
+PX = 0.75
+PAGE_WIDTH = 595.28
+PAGE_HEIGHT = 841.89
+PAGE_MARGIN = 75 * PX
+CONTENT_WIDTH = PAGE_WIDTH - 2 * PAGE_MARGIN
+CONTAINER_WIDTH = 540 * PX
+COLUMN_LEFT = PAGE_MARGIN + (CONTENT_WIDTH - CONTAINER_WIDTH) / 2 + 12 * PX
+TOP_MARGIN = 48 * PX
+
+FONT = 'Helvetica'
+FONT_SIZE = 16 * PX
+LINE_HEIGHT = 1.5 * FONT_SIZE
+ASCENT = 0.77
+ROW_HEIGHT = LINE_HEIGHT + 2 * 16 * PX
+HEADING_SIZE = 32 * PX
+
+def column_left(columns):
+    """Left edge of the text in a Bootstrap column that starts after columns twelfths of the row."""
+    return COLUMN_LEFT + CONTAINER_WIDTH * columns / 12
+
+class GridWriter:
+    """Writes lines of text onto A4 pages, starting a new page when a line doesn't fit."""
+
+    def __init__(self, title):
+        self.pdf = pydyf.PDF()
+        self.pdf.info['Title'] = pydyf.String(title)
+        self.pdf.info['Producer'] = pydyf.String('Math Worksheet Generator')
+        self.font = pydyf.Dictionary({
+            'Type': '/Font',
+            'Subtype': '/Type1',
+            'BaseFont': f'/{FONT}',
+            'Encoding': '/WinAnsiEncoding',
+            })
+        self.pdf.add_object(self.font)
+        self.stream = None
+        self.y = 0
+        self.new_page()
+
+    def new_page(self):
+        """Start a new page and move to the top of its content area."""
+        self.stream = pydyf.Stream(compress=True)
+        self.pdf.add_object(self.stream)
+        self.pdf.add_page(pydyf.Dictionary({
+            'Type': '/Page',
+            'Parent': self.pdf.pages.reference,
+            'MediaBox': pydyf.Array([0, 0, PAGE_WIDTH, PAGE_HEIGHT]),
+            'Contents': self.stream.reference,
+            'Resources': pydyf.Dictionary({'Font': pydyf.Dictionary({'F1': self.font.reference})}),
+            }))
+        self.y = 0
+
+    def skip(self, height):
+        """Move down the page, leaving height points blank."""
+        self.y += height
+
+    def row(self, cells, height, font_size=FONT_SIZE, line_height=LINE_HEIGHT, top=0):
+        """Write a row of (x, text) cells, with the text top points below the top of the row."""
+        if self.y > 0 and self.y + height > PAGE_HEIGHT - 2 * PAGE_MARGIN:
+            self.new_page()
+        baseline = PAGE_HEIGHT - PAGE_MARGIN - self.y - top - (line_height - font_size) / 2 - ASCENT * font_size
+        for x, text in cells:
+            self.stream.begin_text()
+            self.stream.set_font_size('F1', font_size)
+            self.stream.text_matrix(1, 0, 0, 1, round(x, 2), round(baseline, 2))
+            self.stream.show_text(pydyf.String(text))
+            self.stream.end_text()
+        self.y += height
+
+    def write(self):
+        """Get the pdf bytes."""
+        output = io.BytesIO()
+        self.pdf.write(output)
+        return output.getvalue()
+
+def write_questions(writer, lines):
+    """Write lines of question text two to a row, like the col-6 grid in the templates."""
+    for i in range(0, len(lines), 2):
+        cells = [(column_left(6 * column), text) for column, text in enumerate(lines[i:i + 2])]
+        writer.row(cells, ROW_HEIGHT, top=16 * PX)
+
+def write_worksheet(questions):
+    """Render the worksheet for a list of questions to pdf bytes."""
+    writer = GridWriter('Worksheet')
+    writer.skip(TOP_MARGIN)
+    writer.row([(column_left(0), 'Name: ' + '_' * 40), (column_left(9), 'Date: ' + '_' * 11)], LINE_HEIGHT + 16 * PX)
+    write_questions(writer, [f"{i}) {question['expression']} =" for i, question in enumerate(questions, start=1)])
+    return writer.write()
+
+def write_answer_key(questions):
+    """Render the answer key for a list of questions to pdf bytes."""
+    writer = GridWriter('Answer Key')
+    writer.skip(TOP_MARGIN)
+    writer.row([(column_left(0), 'Answer Key')], 1.2 * HEADING_SIZE + 8 * PX, font_size=HEADING_SIZE, line_height=1.2 * HEADING_SIZE)
+    write_questions(writer, [f"{i}) {question['expression']} = {question['answer']}" for i, question in enumerate(questions, start=1)])
+    return writer.write()
+
+SHEET_WRITERS = {
+    'worksheet': write_worksheet,
+    'answer-key': write_answer_key,
+}
+
+def write_sheet_pdf(sheet, questions):
+    """Render a worksheet or answer key straight to pdf bytes, without going through html."""
+    return SHEET_WRITERS[sheet](questions)
@@ -0,0 +1,37 @@
+# Gunicorn settings, read automatically by `gunicorn app:app`.
+
+from config import WEB_THREADS
+
+# Load the app once in the master process and warm it up there, so forked workers start with templates, fonts and
+# stylesheets already loaded.
+preload_app = True
+
+# Handle requests on a pool of threads in each worker.  Math api calls are awaited together on the worker's shared event
+# loop and pdfs render on the render pool, so request threads mostly wait on I/O and one worker can serve many at once.
+threads = WEB_THREADS
+
+# Log the app's info messages, like request summaries and the warm up time, next to gunicorn's own on stderr.  Gunicorn's
+# loggers don't pass their messages on to the root logger, so they aren't logged twice, and the request summaries stand
+# in for an access log.
+logconfig_dict = {
+    'root': {'level': 'INFO', 'handlers': ['error_console']},
+    'loggers': {
+        'gunicorn.error': {'level': 'INFO', 'handlers': ['error_console'], 'propagate': False},
+        'gunicorn.access': {'level': 'INFO', 'handlers': [], 'propagate': False},
+    },
+}
+
+def when_ready(server):
+    """Warm up the app in the master process before any workers are forked."""
+    from app import app
+    from warmup import warm_up
+    warm_up(app)
+
+def post_fork(server, worker):
+    """Give each worker its own db connections and start its render processes."""
+    from app import app
+    from models import db
+    from warmup import start_render_pool
+    with app.app_context():
+        db.engine.dispose()
+    start_render_pool(app)
@@ -0,0 +1,10 @@
+import unicodedata
+from urllib.parse import quote
+
+def content_disposition(filename):
+    """Content-Disposition header downloading a file as filename.  Names are typed in by users, so the plain filename is an
+    ASCII only copy without quotes, backslashes or control characters, and browsers that support it get the full name as an
+    RFC 5987 filename*."""
+    ascii_name = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+    ascii_name = ''.join(char for char in ascii_name if char.isprintable() and char not in '"\\')
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename, safe='')}"
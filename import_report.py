@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+PROJECT_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+def parse_importtime(output):
+    """Parse the output of python -X importtime into (module, depth, self_us, cumulative_us) tuples, in the order python printed them."""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        if not self_us.strip().isdigit():
+            # Skip the header line.
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), depth, int(self_us), int(cumulative_us)))
+    return imports
+
+def get_import_report(module='app', limit=20):
+    """Import module in a fresh interpreter and get its total import time and its slowest direct imports, in microseconds."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=PROJECT_FOLDER, check=True,
+        )
+    imports = parse_importtime(result.stderr)
+    total = next(cumulative_us for name, depth, self_us, cumulative_us in imports if name == module and depth == 0)
+    direct = sorted(((name, cumulative_us) for name, depth, self_us, cumulative_us in imports if depth == 1), key=lambda item: item[1], reverse=True)
+    return total, direct[:limit]
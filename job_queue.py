@@ -0,0 +1,58 @@
+import logging
+import os
+import queue
+import threading
+
+from config import SAVE_WORKERS, SAVE_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting."""
+
+class JobQueue:
+    """Bounded queue of jobs handled by background worker threads in this process."""
+
+    def __init__(self, handler, workers=SAVE_WORKERS, max_size=SAVE_QUEUE_DEPTH, name='job-worker'):
+        """Each job is handled by calling handler(*args) on a worker thread."""
+        self.handler = handler
+        self.workers = workers
+        self.max_size = max_size
+        self.name = name
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        """Start the worker threads the first time a job is queued, or after a fork."""
+        with self._lock:
+            if self._queue is None or self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.max_size)
+                self._pid = os.getpid()
+                for i in range(self.workers):
+                    threading.Thread(target=self._work, args=(self._queue,), name=f'{self.name}-{i}', daemon=True).start()
+        return self._queue
+
+    def _work(self, jobs):
+        """Handle jobs until the process exits."""
+        while True:
+            args = jobs.get()
+            try:
+                self.handler(*args)
+            except Exception:
+                logger.exception('%s job failed', self.name)
+            finally:
+                jobs.task_done()
+
+    def enqueue(self, *args):
+        """Queue a job.  Raises JobQueueFull if the queue is full."""
+        jobs = self._start()
+        try:
+            jobs.put_nowait(args)
+        except queue.Full:
+            raise JobQueueFull(f'More than {self.max_size} jobs are waiting.')
+
+    def join(self):
+        """Wait until every queued job has been handled."""
+        if self._queue is not None:
+            self._queue.join()
@@ -0,0 +1,208 @@
+import contextvars
+import functools
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# Histogram buckets in seconds, from a fast db query up to a slow WeasyPrint render.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    """Counts of observed durations per bucket, with their sum.  Not thread safe on its own, Metrics holds a lock around it."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative(self):
+        """(bound, count) pairs counting every observation up to each bound, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield format_number(bound), total
+        yield '+Inf', self.count
+
+class RequestTrace:
+    """Time spent in each stage while handling one request.  Stages can finish on other threads, like the render pool's callbacks."""
+
+    def __init__(self, clock=time.perf_counter):
+        self.start = clock()
+        self.status = None
+        self.stages = defaultdict(lambda: [0, 0.0])
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            totals = self.stages[stage]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def summary(self):
+        """Stages slowest first, like 'db 4x 2.1 ms, template 1x 1.3 ms'."""
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1][1])
+        return ', '.join(f'{stage} {count}x {seconds * 1000:.1f} ms' for stage, (count, seconds) in stages)
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+def format_number(value):
+    return f'{value:g}' if isinstance(value, float) else str(value)
+
+def format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+class Metrics:
+    """Durations, errors and work in flight for each stage of handling a request, and for requests as a whole.  Counts are kept per worker process."""
+
+    def __init__(self, prefix='worksheet', buckets=BUCKETS, clock=time.perf_counter):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.clock = clock
+        self._stage_seconds = {}
+        self._stage_errors = defaultdict(int)
+        self._stage_in_flight = defaultdict(int)
+        self._request_seconds = {}
+        self._requests_in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self, stage):
+        """Start timing a stage and return a token for finish().  Counts the stage as in flight until then."""
+        with self._lock:
+            self._stage_in_flight[stage] += 1
+        return stage, self.clock(), _current_trace.get()
+
+    def finish(self, token, error=False):
+        """Stop timing a stage started with start(), adding its time to the request that started it."""
+        stage, start, trace = token
+        seconds = self.clock() - start
+        with self._lock:
+            self._stage_in_flight[stage] -= 1
+            if stage not in self._stage_seconds:
+                self._stage_seconds[stage] = Histogram(self.buckets)
+            self._stage_seconds[stage].observe(seconds)
+            if error:
+                self._stage_errors[stage] += 1
+        if trace is not None:
+            trace.add(stage, seconds)
+        return seconds
+
+    @contextmanager
+    def span(self, stage):
+        """Time the code in a with block as a stage.  Exceptions are counted as errors and raised again."""
+        token = self.start(stage)
+        try:
+            yield
+        except BaseException:
+            self.finish(token, error=True)
+            raise
+        self.finish(token)
+
+    def timed(self, stage):
+        """Decorator timing every call of a function as a stage."""
+        def decorator(function):
+            @functools.wraps(function)
+            def timed_function(*args, **kwargs):
+                with self.span(stage):
+                    return function(*args, **kwargs)
+            return timed_function
+        return decorator
+
+    def start_request(self):
+        """Start tracing a request on this thread.  Stages started on this thread until finish_request() are added to the trace."""
+        trace = RequestTrace(self.clock)
+        with self._lock:
+            self._requests_in_flight += 1
+        _current_trace.set(trace)
+        return trace
+
+    def finish_request(self, trace, endpoint, status):
+        """Stop tracing a request and count it by endpoint and status.  Returns how long it took in seconds."""
+        _current_trace.set(None)
+        seconds = self.clock() - trace.start
+        key = (endpoint or 'none', str(status))
+        with self._lock:
+            self._requests_in_flight -= 1
+            if key not in self._request_seconds:
+                self._request_seconds[key] = Histogram(self.buckets)
+            self._request_seconds[key].observe(seconds)
+        return seconds
+
+    def _histogram_lines(self, name, histograms, label_names):
+        for values, histogram in sorted(histograms.items()):
+            labels = list(zip(label_names, values))
+            for bound, count in histogram.cumulative():
+                yield f'{name}_bucket{{{format_labels(labels + [("le", bound)])}}} {count}'
+            yield f'{name}_sum{{{format_labels(labels)}}} {histogram.sum:.6f}'
+            yield f'{name}_count{{{format_labels(labels)}}} {histogram.count}'
+
+    def render(self):
+        """The metrics in the Prometheus text format."""
+        prefix = self.prefix
+        with self._lock:
+            stage_seconds = {(stage,): histogram for stage, histogram in self._stage_seconds.items()}
+            lines = [
+                f'# HELP {prefix}_stage_seconds Time spent in each stage of handling requests.',
+                f'# TYPE {prefix}_stage_seconds histogram',
+                *self._histogram_lines(f'{prefix}_stage_seconds', stage_seconds, ['stage']),
+                f'# HELP {prefix}_stage_errors_total Stages that raised an exception.',
+                f'# TYPE {prefix}_stage_errors_total counter',
+                *(f'{prefix}_stage_errors_total{{stage="{stage}"}} {self._stage_errors[stage]}' for stage in sorted(self._stage_seconds)),
+                f'# HELP {prefix}_stage_in_flight Stages running right now.',
+                f'# TYPE {prefix}_stage_in_flight gauge',
+                *(f'{prefix}_stage_in_flight{{stage="{stage}"}} {count}' for stage, count in sorted(self._stage_in_flight.items())),
+                f'# HELP {prefix}_request_seconds Time taken to handle requests.',
+                f'# TYPE {prefix}_request_seconds histogram',
+                *self._histogram_lines(f'{prefix}_request_seconds', self._request_seconds, ['endpoint', 'status']),
+                f'# HELP {prefix}_requests_in_flight Requests being handled right now.',
+                f'# TYPE {prefix}_requests_in_flight gauge',
+                f'{prefix}_requests_in_flight {self._requests_in_flight}',
+                ]
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        """Forget everything counted so far."""
+        with self._lock:
+            self._stage_seconds.clear()
+            self._stage_errors.clear()
+            self._request_seconds.clear()
+
+def instrument_engine(engine, metrics):
+    """Time every query run on a SQLAlchemy engine, or on every engine if given the Engine class, as the db stage."""
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_token = metrics.start('db')
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        metrics.finish(context.metrics_token)
+        context.metrics_token = None
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(exception_context):
+        token = getattr(exception_context.execution_context, 'metrics_token', None)
+        if token is not None:
+            metrics.finish(token, error=True)
+
+def instrument_templates(environment, metrics):
+    """Time every template rendered by a Jinja environment as the template stage.  Templates loaded before this is called aren't timed."""
+    class TimedTemplate(environment.template_class):
+        def render(self, *args, **kwargs):
+            with metrics.span('template'):
+                return super().render(*args, **kwargs)
+
+    environment.template_class = TimedTemplate
+
+metrics = Metrics()
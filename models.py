@@ -1,11 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import make_transient_to_detached
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, timedelta
 
-db = SQLAlchemy()
+from question_codec import encode_questions, decode_questions
+from passwords import password_hasher
 
-bcrypt = Bcrypt()
+db = SQLAlchemy()
 
 def connect_db(app):
     """Connect to database."""
@@ -13,6 +15,22 @@ def connect_db(app):
     db.app = app
     db.init_app(app)
 
+def upgrade_db():
+    """Bring a database made by an older version of the app up to date without dropping any data.  Creates the tables that
+    are missing and adds the columns and indexes added to existing tables.  Safe to run more than once."""
+    db.create_all()
+    
+    # Pdfs saved before worksheets were stored as questions have no worksheet.
+    columns = {column['name'] for column in inspect(db.engine).get_columns('pdfs')}
+    if 'worksheet_id' not in columns:
+        with db.engine.begin() as connection:
+            connection.execute(text('ALTER TABLE pdfs ADD COLUMN worksheet_id INTEGER REFERENCES worksheets (id) ON DELETE CASCADE'))
+    
+    # create_all() skips the indexes of tables that already exist, like the ones listing a user's pdfs and worksheets.
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 class User(db.Model):
     """User model."""
     
@@ -26,26 +44,48 @@ class User(db.Model):
     
     email = db.Column(db.String(50), nullable=False, unique=True)
     
-    pdfs = db.relationship('PDF')
+    pdfs = db.relationship('PDF', cascade='all, delete', passive_deletes=True)
+    
+    worksheets = db.relationship('Worksheet', cascade='all, delete', passive_deletes=True)
     
     def __repr__(self):
         """Representation of User."""
         return f"<User username={self.username}>"
     
+    @property
+    def saved_worksheet_count(self):
+        """Number of saved worksheets.  Older worksheets saved only as pdf files are counted once for the worksheet and answer key."""
+        worksheets = Worksheet.query.filter_by(user_id=self.id).count()
+        files = PDF.query.filter(PDF.user_id == self.id, PDF.worksheet_id.is_(None), PDF.sheet_type == 'worksheet').count()
+        return worksheets + files
+    
+    def get_identity(self):
+        """Dict of the user's column values, for the user cache.  The password hash is left out and loaded from the db if it is needed."""
+        return {column.name: getattr(self, column.name) for column in self.__table__.columns if column.name != 'password'}
+    
+    @classmethod
+    def from_identity(cls, identity):
+        """Add a user built from cached column values to the db session without querying the db."""
+        user = cls(**identity)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+    
     @classmethod
     def register(cls, username, password, email):
         """Hash password and create new user."""
-        hashed = bcrypt.generate_password_hash(password)
-        # turn bytestring into normal (unicode utf8) string
-        hashed_utf8 = hashed.decode("utf8")
-        return cls(username=username, password=hashed_utf8, email=email)
+        return cls(username=username, password=password_hasher.hash(password), email=email)
     
     @classmethod
     def authenticate(cls, username, password):
         """Check that a user is exists and the password provided is correct."""
         user = User.query.filter_by(username=username).first()
         
-        if user and bcrypt.check_password_hash(user.password, password):
+        if user and password_hasher.check(user.password, password):
+            # Upgrade the hash while we have the password if the bcrypt cost factor has changed.
+            if password_hasher.needs_rehash(user.password):
+                user.password = password_hasher.hash(password)
+                db.session.add(user)
+                db.session.commit()
             return user
         else:
             return False
@@ -69,21 +109,140 @@ class PDF(db.Model):
     
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     
+    worksheet_id = db.Column(db.Integer, db.ForeignKey('worksheets.id', ondelete='CASCADE'), index=True)
+    
     unique_s3_filename = db.Column(db.String, unique=True, nullable=False)
     
     filename = db.Column(db.String, nullable=False)
     
     sheet_type = db.Column(db.String, nullable=False)
     
-    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow())
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Lists a user's files newest first without sorting them.
+    __table_args__ = (db.Index('ix_pdfs_user_id_timestamp', user_id, timestamp.desc(), id.desc()),)
     
     def __repr__(self):
         """Representation of PDF file."""
         return f"<PDF id={self.id} user_id={self.user_id} unique_s3_filename={self.unique_s3_filename} filename={self.filename}>"
     
     @classmethod
-    def create_new_pdf(cls, user_id, filename, sheet_type):
+    def create_new_pdf(cls, user_id, filename, sheet_type, worksheet_id=None):
         """Create a new instance of PDF model."""
         # Create a unique filename for S3 bucket using uuid.
         unique_s3_filename = f'{uuid4().hex}.pdf'
-        return cls(user_id=user_id, unique_s3_filename=unique_s3_filename, filename=filename, sheet_type=sheet_type)
\ No newline at end of file
+        return cls(user_id=user_id, unique_s3_filename=unique_s3_filename, filename=filename, sheet_type=sheet_type, worksheet_id=worksheet_id)
+    
+class Worksheet(db.Model):
+    """Saved worksheet.  Only the questions are stored, the worksheet and answer key pdfs are rendered from them when needed."""
+    
+    __tablename__ = 'worksheets'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    
+    name = db.Column(db.String, nullable=False)
+    
+    questions = db.Column(db.Text, nullable=False)
+    
+    # Version of the pdf layout the worksheet was saved with, so it keeps being rendered with that layout.
+    template_version = db.Column(db.String, nullable=False)
+    
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    # Optional pdfs rendered ahead of time and kept in storage.
+    pdfs = db.relationship('PDF', cascade='all, delete', passive_deletes=True)
+    
+    # Lists a user's worksheets newest first without sorting them.
+    __table_args__ = (db.Index('ix_worksheets_user_id_timestamp', user_id, timestamp.desc(), id.desc()),)
+    
+    def __repr__(self):
+        """Representation of Worksheet."""
+        return f"<Worksheet id={self.id} user_id={self.user_id} name={self.name}>"
+    
+    @classmethod
+    def create_new_worksheet(cls, user_id, name, questions, template_version):
+        """Create a new instance of Worksheet model from a list of question dicts."""
+        return cls(user_id=user_id, name=name, questions=encode_questions(questions), template_version=template_version)
+    
+    def get_questions(self):
+        """Get the list of question dicts for this worksheet."""
+        return decode_questions(self.questions)
+    
+    def serialize(self):
+        """Serialize the worksheet to a dict for JSON responses."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'timestamp': self.timestamp.isoformat(),
+        }
+    
+class SaveJob(db.Model):
+    """Background job that saves a worksheet and answer key."""
+    
+    __tablename__ = 'save_jobs'
+    
+    STATUSES = ['queued', 'running', 'done', 'failed']
+    
+    id = db.Column(db.String, primary_key=True)
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    
+    name = db.Column(db.String, nullable=False)
+    
+    status = db.Column(db.String, nullable=False, default='queued')
+    
+    error = db.Column(db.Text)
+    
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __repr__(self):
+        """Representation of save job."""
+        return f"<SaveJob id={self.id} user_id={self.user_id} status={self.status}>"
+    
+    @classmethod
+    def create_new_job(cls, user_id, name):
+        """Create a new queued save job."""
+        return cls(id=uuid4().hex, user_id=user_id, name=name, status='queued')
+    
+    def serialize(self):
+        """Serialize the job status to a dict for JSON responses."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'error': self.error,
+        }
+    
+class Draft(db.Model):
+    """Newly generated worksheet that hasn't been saved yet.  Only its id is kept in the session cookie."""
+    
+    __tablename__ = 'drafts'
+    
+    id = db.Column(db.String, primary_key=True)
+    
+    name = db.Column(db.String, nullable=False)
+    
+    questions = db.Column(db.Text, nullable=False)
+    
+    timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        """Representation of draft."""
+        return f"<Draft id={self.id} name={self.name}>"
+    
+    @classmethod
+    def create_new_draft(cls, name, questions):
+        """Create a new draft from a list of question dicts."""
+        return cls(id=uuid4().hex, name=name, questions=encode_questions(questions))
+    
+    @classmethod
+    def delete_expired(cls, max_age):
+        """Delete drafts older than max_age seconds.  Returns the number deleted."""
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        return cls.query.filter(cls.timestamp < cutoff).delete(synchronize_session=False)
+    
+    def get_questions(self):
+        """Get the list of question dicts for this draft."""
+        return decode_questions(self.questions)
@@ -0,0 +1,43 @@
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+class Page:
+    """One page of rows, newest first.  next_cursor is passed back as before to get the following page, or None on the last page."""
+
+    def __init__(self, items, cursor, next_cursor):
+        self.items = items
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+def encode_cursor(row):
+    """Cursor pointing just after a row, from its timestamp and id."""
+    return f'{row.timestamp.isoformat()}_{row.id}'
+
+def decode_cursor(cursor):
+    """Get the (timestamp, id) a cursor points after, or None if it isn't a valid cursor."""
+    timestamp, _, row_id = (cursor or '').rpartition('_')
+    try:
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        return None
+
+def paginate(query, model, before=None, per_page=25):
+    """Get a page of a query ordered by model's timestamp and id, newest first.  Seeks to the cursor with an index instead of counting past earlier pages."""
+    position = decode_cursor(before)
+    if position:
+        query = query.filter(tuple_(model.timestamp, model.id) < position)
+    else:
+        before = None
+
+    # Get one extra row to find out if there is a next page.
+    rows = query.order_by(model.timestamp.desc(), model.id.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > per_page else None
+    return Page(items, before, next_cursor)
@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from config import (BCRYPT_ROUNDS, PASSWORD_WORKERS, PASSWORD_QUEUE_DEPTH, PASSWORD_QUEUE_TIMEOUT,
+                    LOGIN_MAX_FAILURES, LOGIN_FAILURE_WINDOW)
+
+class PasswordQueueFull(Exception):
+    """Raised when too many passwords are already waiting to be hashed or checked."""
+
+def get_rounds(hashed):
+    """Cost factor a bcrypt hash was made with."""
+    return int(hashed.split('$')[2])
+
+class PasswordHasher:
+    """Hashes and checks passwords with bcrypt on a small pool of threads, so logins can't use more than workers cores per web worker."""
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=PASSWORD_WORKERS, max_queue=PASSWORD_QUEUE_DEPTH, queue_timeout=PASSWORD_QUEUE_TIMEOUT):
+        """With workers of 0 passwords are hashed in the calling thread.  max_queue limits the passwords waiting or being hashed at once."""
+        self.rounds = rounds
+        self.workers = workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get_executor(self):
+        """Get the thread pool, starting it the first time or after a fork."""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.max_queue)
+        return self._executor
+
+    def run(self, function, *args):
+        """Call function on the pool and wait for its result.  Raises PasswordQueueFull if the queue stays full.  bcrypt releases the GIL, so other requests keep running meanwhile."""
+        if self.workers == 0:
+            return function(*args)
+
+        executor = self.get_executor()
+        slots = self._slots
+        if not slots.acquire(timeout=self.queue_timeout):
+            raise PasswordQueueFull(f'More than {self.max_queue} passwords are waiting to be checked.')
+        try:
+            return executor.submit(function, *args).result()
+        finally:
+            slots.release()
+
+    def hash(self, password):
+        """Hash a password with the configured cost factor."""
+        hashed = self.run(bcrypt.hashpw, password.encode('utf8'), bcrypt.gensalt(self.rounds))
+        return hashed.decode('utf8')
+
+    def check(self, hashed, password):
+        """Check a password against a hash."""
+        return self.run(bcrypt.checkpw, password.encode('utf8'), hashed.encode('utf8'))
+
+    def needs_rehash(self, hashed):
+        """Was the hash made with a different cost factor than the one configured now?"""
+        return get_rounds(hashed) != self.rounds
+
+class LoginThrottle:
+    """Counts failed logins per username in this worker.  After max_failures within window seconds the username is locked out until the oldest failure expires."""
+
+    def __init__(self, max_failures=LOGIN_MAX_FAILURES, window=LOGIN_FAILURE_WINDOW, max_usernames=10000, clock=time.monotonic):
+        self.max_failures = max_failures
+        self.window = window
+        self.max_usernames = max_usernames
+        self.clock = clock
+        self._failures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _recent(self, username):
+        """Failure times for username within the window, dropping older ones.  Call with the lock held."""
+        failures = self._failures.get(username)
+        if failures is None:
+            return None
+        cutoff = self.clock() - self.window
+        while failures and failures[0] <= cutoff:
+            failures.popleft()
+        if not failures:
+            del self._failures[username]
+            return None
+        return failures
+
+    def is_throttled(self, username):
+        """Has username failed to log in too many times recently?"""
+        if self.max_failures <= 0:
+            return False
+        with self._lock:
+            failures = self._recent(username)
+            return failures is not None and len(failures) >= self.max_failures
+
+    def record_failure(self, username):
+        """Count a failed login for username."""
+        with self._lock:
+            failures = self._recent(username)
+            if failures is None:
+                failures = self._failures[username] = deque(maxlen=max(self.max_failures, 1))
+            failures.append(self.clock())
+            self._failures.move_to_end(username)
+            # Forget the usernames that failed longest ago, so guessing random usernames can't use up memory.
+            while len(self._failures) > self.max_usernames:
+                self._failures.popitem(last=False)
+
+    def reset(self, username):
+        """Forget the failed logins for username after it logs in."""
+        with self._lock:
+            self._failures.pop(username, None)
+
+    def clear(self):
+        """Forget every failed login."""
+        with self._lock:
+            self._failures.clear()
+
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
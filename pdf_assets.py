@@ -0,0 +1,60 @@
+import functools
+import os
+from urllib.parse import urlsplit
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Stylesheets worksheet-base.html links to, and the pruned local copies pdfs are rendered with instead.
+# Font Awesome has no local copy because the pdfs don't use any icons.
+VENDORED_STYLESHEETS = {
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css': 'pdf/bootstrap-grid.css',
+    'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.1.1/css/all.min.css': None,
+}
+
+MIME_TYPES = {
+    '.css': 'text/css',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.ttf': 'font/ttf',
+    '.png': 'image/png',
+    '.svg': 'image/svg+xml',
+}
+
+class RemoteURLBlocked(ValueError):
+    """Raised for urls that would make a render wait on the network."""
+
+def get_static_path(path):
+    """Path of a file in the static folder for a /static/ url path, or None if it is outside the static folder."""
+    if not path.startswith('/static/'):
+        return None
+    full_path = os.path.normpath(os.path.join(STATIC_FOLDER, path[len('/static/'):]))
+    if not full_path.startswith(STATIC_FOLDER + os.sep):
+        return None
+    return full_path
+
+def fetch_url(url):
+    """WeasyPrint url fetcher that never goes to the network.  Links to vendored stylesheets get an empty stylesheet because get_stylesheets already parsed them.  /static/ urls are read from the static folder and anything else is refused."""
+    if url in VENDORED_STYLESHEETS:
+        return {'string': '', 'mime_type': 'text/css', 'encoding': 'utf-8', 'redirected_url': url}
+
+    parts = urlsplit(url)
+    path = get_static_path(parts.path) if parts.scheme in ('http', 'https') else None
+    if path is None or not os.path.isfile(path):
+        raise RemoteURLBlocked(f'Not fetching {url} while rendering a pdf.')
+    mime_type = MIME_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream')
+    return {'file_obj': open(path, 'rb'), 'mime_type': mime_type, 'redirected_url': url}
+
+@functools.lru_cache(maxsize=None)
+def get_font_config():
+    """WeasyPrint font configuration, shared by every render in this process."""
+    from weasyprint.fonts import FontConfiguration
+    return FontConfiguration()
+
+@functools.lru_cache(maxsize=None)
+def get_stylesheets():
+    """Parse the vendored stylesheets once per process and reuse them for every render."""
+    from weasyprint import CSS
+    return tuple(
+        CSS(filename=os.path.join(STATIC_FOLDER, local_file), url_fetcher=fetch_url, font_config=get_font_config())
+        for local_file in VENDORED_STYLESHEETS.values() if local_file
+        )
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from config import PDF_CACHE_MAX_BYTES, PDF_CACHE_DIR, PDF_CACHE_DISK_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Temporary files older than this were left by a write that failed part way, so pruning removes them.
+STALE_TEMP_SECONDS = 60
+
+TEMPLATE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+TEMPLATE_FILES = ['worksheet-base.html', 'worksheet.html', 'answer-key.html', os.path.join('..', 'static', 'pdf', 'bootstrap-grid.css')]
+
+def get_template_version(template_folder=TEMPLATE_FOLDER, template_files=TEMPLATE_FILES):
+    """Hash of the pdf templates, so cached pdfs are not reused after the templates change."""
+    digest = hashlib.sha256()
+    for template_file in template_files:
+        with open(os.path.join(template_folder, template_file), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()[:12]
+
+TEMPLATE_VERSION = get_template_version()
+
+def get_cache_key(sheet, questions, template_version=TEMPLATE_VERSION):
+    """Content hash of everything that goes into a rendered pdf."""
+    payload = json.dumps([sheet, template_version, questions], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf8')).hexdigest()
+
+class PDFCache:
+    """Rendered pdfs by content hash.  Kept in memory up to max_bytes, and optionally on disk where every worker can read them."""
+
+    def __init__(self, max_bytes=PDF_CACHE_MAX_BYTES, directory=PDF_CACHE_DIR, disk_max_bytes=PDF_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.disk_max_bytes = disk_max_bytes
+        # The disk tier is pruned after about a tenth of its size was written, not on every write.
+        self.prune_every_bytes = disk_max_bytes // 10
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._written = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _disk_path(self, key):
+        """Path of the on-disk copy of a pdf."""
+        return os.path.join(self.directory, f'{key}.pdf')
+
+    def _remember(self, key, data):
+        """Add a pdf to the memory tier, evicting the least recently used pdfs over the size bound."""
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def get(self, key):
+        """Get a cached pdf, or None if it has not been rendered yet."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        if self.directory:
+            path = self._disk_path(key)
+            try:
+                with open(path, 'rb') as file:
+                    data = file.read()
+                # Touch the file so disk pruning keeps recently used pdfs.
+                os.utime(path)
+            except OSError:
+                data = None
+            if data is not None:
+                self._remember(key, data)
+                with self._lock:
+                    self.hits += 1
+                return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, data):
+        """Cache a rendered pdf.  If it can't be written to disk, like when the disk is full, it is only kept in memory."""
+        self._remember(key, data)
+        if self.directory:
+            # Write to a temporary file first so other workers never read a partial pdf.
+            temp_path = None
+            try:
+                fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+                with os.fdopen(fd, 'wb') as file:
+                    file.write(data)
+                os.replace(temp_path, self._disk_path(key))
+            except OSError as error:
+                logger.warning('Could not write pdf %s to the disk cache: %s', key, error)
+                if temp_path is not None:
+                    try:
+                        os.remove(temp_path)
+                    except OSError:
+                        pass
+                return
+            with self._lock:
+                self._written += len(data)
+                prune = self._written >= self.prune_every_bytes
+                if prune:
+                    self._written = 0
+            if prune:
+                self.prune_disk()
+
+    def prune_disk(self):
+        """Remove the least recently used pdfs from disk while the directory is over its size bound, and stale temporary files."""
+        files = []
+        stale = time.time() - STALE_TEMP_SECONDS
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pdf') or entry.name.endswith('.tmp'):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.endswith('.pdf'):
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+                elif stat.st_mtime < stale:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+        total = sum(size for mtime, size, path in files)
+        for mtime, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+pdf_cache = PDFCache()
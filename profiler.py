@@ -0,0 +1,93 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import PROFILE_ROUTES, PROFILE_SAMPLE_RATE, PROFILE_INTERVAL, PROFILE_MAX_STACKS
+
+# Counted in place of new stacks once an endpoint has max_stacks different ones.
+OTHER_STACKS = '[other stacks]'
+
+def collapse_stack(frame):
+    """Stack of a frame as 'module.function' names, outermost first, joined with semicolons as flame graph tools expect."""
+    names = []
+    while frame is not None:
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class Profiler:
+    """Samples the stacks of the threads handling profiled requests every interval seconds, and counts how often each stack was seen per endpoint.  Nothing runs until a request is profiled."""
+
+    def __init__(self, routes=PROFILE_ROUTES, sample_rate=PROFILE_SAMPLE_RATE, interval=PROFILE_INTERVAL, max_stacks=PROFILE_MAX_STACKS, rand=random.random):
+        """Requests to routes are always profiled, and a sample_rate fraction of other requests.  Each endpoint keeps at most max_stacks different stacks."""
+        self.routes = frozenset(routes)
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.max_stacks = max_stacks
+        self.rand = rand
+        self.enabled = bool(self.routes) or sample_rate > 0
+        self._active = dict()
+        self._stacks = dict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def should_profile(self, endpoint):
+        """Should a request to endpoint be profiled?"""
+        return endpoint in self.routes or (self.sample_rate > 0 and self.rand() < self.sample_rate)
+
+    def start(self, endpoint):
+        """Start sampling the calling thread for a request to endpoint, starting the sampler thread the first time or after a fork."""
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._wake = threading.Event()
+                self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+                self._pid = os.getpid()
+                self._thread.start()
+            self._active[threading.get_ident()] = endpoint or 'none'
+            self._wake.set()
+
+    def stop(self):
+        """Stop sampling the calling thread."""
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        """Sampler thread.  Sleeps until a request is profiled, then samples until no request is."""
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            self.sample()
+
+    def sample(self):
+        """Count the current stack of each thread being profiled."""
+        with self._lock:
+            if not self._active:
+                self._wake.clear()
+                return
+            active = dict(self._active)
+        frames = sys._current_frames()
+        stacks = [(endpoint, collapse_stack(frames[thread_id])) for thread_id, endpoint in active.items() if thread_id in frames]
+        with self._lock:
+            for endpoint, stack in stacks:
+                counts = self._stacks.setdefault(endpoint, Counter())
+                if stack not in counts and len(counts) >= self.max_stacks:
+                    stack = OTHER_STACKS
+                counts[stack] += 1
+
+    def collapsed(self, endpoint=None):
+        """The counted stacks in the collapsed format flamegraph.pl and speedscope read, with the endpoint as the root frame.  Only endpoint's stacks if given."""
+        with self._lock:
+            stacks = [(name, stack, count) for name, counts in self._stacks.items() if endpoint in (None, name) for stack, count in counts.items()]
+        return ''.join(f'{name};{stack} {count}\n' for name, stack, count in sorted(stacks))
+
+    def clear(self):
+        """Forget the stacks counted so far."""
+        with self._lock:
+            self._stacks.clear()
+
+profiler = Profiler()
@@ -0,0 +1,33 @@
+import re
+
+from question_generator import build_question
+
+# One question is "<first><operation><second>", for example "88/2" or "5--3", and questions are separated by ";".
+QUESTION_PATTERN = re.compile(r'^(-?\d+)([-+*/])(-?\d+)$')
+
+def get_answer(first, operation, second):
+    """Work out the answer to a question."""
+    if operation == '+':
+        return first + second
+    if operation == '-':
+        return first - second
+    if operation == '*':
+        return first * second
+    if first % second == 0:
+        return first // second
+    return first / second
+
+def encode_questions(questions):
+    """Pack a list of question dicts into a short string.  Answers and expressions are left out since they can be worked out again."""
+    return ';'.join(f"{question['first']}{question['operation']}{question['second']}" for question in questions)
+
+def decode_questions(encoded):
+    """Unpack a string from encode_questions back into a list of question dicts."""
+    questions = []
+    for part in encoded.split(';') if encoded else []:
+        match = QUESTION_PATTERN.match(part)
+        if not match:
+            raise ValueError(f'Invalid question: {part}')
+        first, operation, second = int(match.group(1)), match.group(2), int(match.group(3))
+        questions.append(build_question(first, second, operation, get_answer(first, operation, second)))
+    return questions
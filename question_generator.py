@@ -0,0 +1,114 @@
+import random
+
+from config import API_BASE_URL, QUESTION_SOURCE, MATH_API_FALLBACK
+from metrics import metrics
+
+# Largest operand the local generator accepts, and the bound the worksheet form checks.
+OPERAND_LIMIT = 1000000
+
+OPERATIONS = {
+    'add': '+',
+    'sub': '-',
+    'mul': '*',
+    'div': '/',
+}
+
+def ceil_div(a, b):
+    """Integer division rounding towards positive infinity."""
+    return -(-a // b)
+
+def get_operand_range(params):
+    """Get the inclusive (minimum, maximum) operand range from the api style params.  Raises ValueError for numbers bigger than OPERAND_LIMIT."""
+    minimum = int(params.get('min', 0))
+    maximum = int(params.get('max', 100))
+    if minimum > maximum:
+        minimum, maximum = maximum, minimum
+    if minimum < -OPERAND_LIMIT or maximum > OPERAND_LIMIT:
+        raise ValueError(f'Numbers must be between {-OPERAND_LIMIT} and {OPERAND_LIMIT}.')
+    return minimum, maximum
+
+def draw_divisor(minimum, maximum, rand):
+    """Draw a number other than zero from the inclusive range, without building a list of the range."""
+    count = maximum - minimum + 1
+    if minimum <= 0 <= maximum:
+        count -= 1
+    if count <= 0:
+        raise ValueError('Division needs a number other than zero in the range.')
+    divisor = minimum + rand.randrange(count)
+    # Skip over zero by shifting the numbers from zero up by one.
+    if minimum <= 0 <= divisor:
+        divisor += 1
+    return divisor
+
+def build_question(first, second, operation, answer):
+    """Build a question dict in the same shape the math api returns."""
+    return {
+        'expression': f'{first} {operation} {second}',
+        'answer': answer,
+        'first': first,
+        'second': second,
+        'operation': operation,
+    }
+
+def generate_division(divisors, minimum, maximum, rand):
+    """Generate division questions with whole number answers.  The dividend is a multiple of the divisor that stays in range."""
+    questions = []
+    for divisor in divisors:
+        if divisor > 0:
+            low, high = ceil_div(minimum, divisor), maximum // divisor
+        else:
+            low, high = ceil_div(maximum, divisor), minimum // divisor
+        # A quotient of 1 always keeps the dividend in range, so low <= high here.
+        answer = rand.randint(low, high)
+        questions.append(build_question(divisor * answer, divisor, OPERATIONS['div'], answer))
+    return questions
+
+def generate_questions(operations, number_questions, params, rand=random):
+    """Generate a batch of math questions locally instead of calling the math api once per question."""
+    if operations != 'random' and operations not in OPERATIONS:
+        raise ValueError(f'Unsupported operation: {operations}')
+
+    minimum, maximum = get_operand_range(params)
+    allow_negative = bool(params.get('negative'))
+
+    # Draw every operation and operand for the whole worksheet in one go.
+    if operations == 'random':
+        chosen = rand.choices(list(OPERATIONS), k=number_questions)
+    else:
+        chosen = [operations] * number_questions
+    firsts = [rand.randint(minimum, maximum) for i in range(number_questions)]
+    seconds = [rand.randint(minimum, maximum) for i in range(number_questions)]
+
+    divisors = [draw_divisor(minimum, maximum, rand) for i in range(chosen.count('div'))]
+    division_questions = iter(generate_division(divisors, minimum, maximum, rand))
+
+    questions = []
+    for operation, first, second in zip(chosen, firsts, seconds):
+        if operation == 'add':
+            questions.append(build_question(first, second, OPERATIONS['add'], first + second))
+        elif operation == 'sub':
+            if not allow_negative and first < second:
+                first, second = second, first
+            questions.append(build_question(first, second, OPERATIONS['sub'], first - second))
+        elif operation == 'mul':
+            questions.append(build_question(first, second, OPERATIONS['mul'], first * second))
+        else:
+            questions.append(next(division_questions))
+    return questions
+
+def fetch_questions(operations, number_questions, params):
+    """Get questions from the math api, filling in any it doesn't return with the local generator.  aiohttp is only imported once the api is used."""
+    from api_helpers import get_math_data, run_in_loop
+    with metrics.span('math_api'):
+        return run_in_loop(get_math_data(API_BASE_URL, operations, number_questions, params, backfill=generate_questions))
+
+def get_questions(operations, number_questions, params):
+    """Get questions for a worksheet.  Use the local generator unless the math api is configured as the source or as a fallback."""
+    if QUESTION_SOURCE == 'api':
+        return fetch_questions(operations, number_questions, params)
+    try:
+        return generate_questions(operations, number_questions, params)
+    except ValueError:
+        if not MATH_API_FALLBACK:
+            raise
+        return fetch_questions(operations, number_questions, params)
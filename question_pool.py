@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+
+from config import QUESTION_POOL_ENABLED, QUESTION_POOL_SIZE, QUESTION_POOL_MAX_KEYS
+from job_queue import JobQueue, JobQueueFull
+from question_generator import get_questions
+
+logger = logging.getLogger(__name__)
+
+def get_pool_key(operations, params):
+    """Key for the pool from the worksheet parameters that change which questions can be generated."""
+    return (operations, int(params.get('min', 0)), int(params.get('max', 100)), bool(params.get('negative')))
+
+class QuestionPool:
+    """Buffer of ready-made questions for each combination of worksheet parameters, refilled in the background by one worker thread per process."""
+
+    def __init__(self, fill, buffer_size=QUESTION_POOL_SIZE, max_keys=QUESTION_POOL_MAX_KEYS, low_water=None, background=True):
+        """fill is called as fill(operations, number_questions, params) to generate more questions.  A buffer is refilled once it
+        drops below low_water questions, half of buffer_size by default, so most draws don't start a refill."""
+        self.fill = fill
+        self.buffer_size = buffer_size
+        self.max_keys = max_keys
+        self.low_water = buffer_size // 2 if low_water is None else low_water
+        self.background = background
+        self._refills = JobQueue(self.refill, workers=1, max_size=max_keys, name='question-pool-refill')
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._buffers = OrderedDict()
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def _check_fork(self):
+        """Forget buffers and refills inherited from the parent process after a fork."""
+        if self._pid != os.getpid():
+            self._buffers = OrderedDict()
+            self._refilling = set()
+            self._lock = threading.Lock()
+            self._pid = os.getpid()
+
+    def draw(self, operations, number_questions, params):
+        """Take number_questions questions from the pool.  On a miss generate them directly, then refill the pool in the background."""
+        self._check_fork()
+        key = get_pool_key(operations, params)
+
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is not None:
+                self._buffers.move_to_end(key)
+            if buffer is not None and len(buffer) >= number_questions:
+                questions = [buffer.popleft() for i in range(number_questions)]
+                self.hits += 1
+            else:
+                questions = None
+                self.misses += 1
+
+        if questions is None:
+            questions = self.fill(operations, number_questions, params)
+
+        self.schedule_refill(key, operations, params)
+        return questions
+
+    def schedule_refill(self, key, operations, params):
+        """Queue a refill of the buffer for key if it is below the low water mark and isn't already queued."""
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if (buffer is not None and len(buffer) >= self.low_water) or key in self._refilling:
+                return
+            self._refilling.add(key)
+
+        if not self.background:
+            self.refill(key, operations, params)
+            return
+        try:
+            self._refills.enqueue(key, operations, params)
+        except JobQueueFull:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def join(self):
+        """Wait until the queued refills are done."""
+        self._refills.join()
+
+    def refill(self, key, operations, params):
+        """Generate questions until the buffer for key is full, evicting the least recently used keys over the cap."""
+        try:
+            with self._lock:
+                buffer = self._buffers.get(key)
+                missing = self.buffer_size - (len(buffer) if buffer is not None else 0)
+            if missing <= 0:
+                return
+
+            questions = self.fill(operations, missing, params)
+
+            with self._lock:
+                buffer = self._buffers.setdefault(key, deque())
+                buffer.extend(questions[:self.buffer_size - len(buffer)])
+                while len(self._buffers) > self.max_keys:
+                    self._buffers.popitem(last=False)
+                    self.evictions += 1
+        except Exception:
+            logger.exception('Could not refill question pool for %s', key)
+        finally:
+            with self._lock:
+                self._refilling.discard(key)
+
+    def stats(self):
+        """Counters for how well the pool is working."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'keys': len(self._buffers),
+                'questions': sum(len(buffer) for buffer in self._buffers.values()),
+            }
+
+question_pool = QuestionPool(get_questions)
+
+def draw_questions(operations, number_questions, params):
+    """Get questions for a worksheet from the question pool, or generate them directly if the pool is turned off."""
+    if QUESTION_POOL_ENABLED:
+        return question_pool.draw(operations, number_questions, params)
+    return get_questions(operations, number_questions, params)
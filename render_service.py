@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as RenderTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from config import RENDER_WORKERS, RENDER_QUEUE_DEPTH, RENDER_QUEUE_TIMEOUT
+from pdf_assets import fetch_url, get_stylesheets, get_font_config
+
+class RenderQueueFull(Exception):
+    """Raised when too many pdfs are already waiting to be rendered."""
+
+# Errors that mean the render pool couldn't make a pdf right now, rather than that the pdf can't be made.  Routes answer them with a 503.
+RENDER_UNAVAILABLE = (RenderQueueFull, RenderTimeout, BrokenProcessPool)
+
+def write_pdf(html, base_url=None):
+    """Render html to pdf bytes with WeasyPrint.  Runs in a render worker process.  Assets come from local copies and the stylesheets are parsed once per worker."""
+    from weasyprint import HTML
+    return HTML(string=html, base_url=base_url, url_fetcher=fetch_url).write_pdf(stylesheets=get_stylesheets(), font_config=get_font_config())
+
+def warm_up_worker():
+    """Import WeasyPrint and parse the stylesheets when a render worker starts instead of on its first job."""
+    get_stylesheets()
+
+class RenderService:
+    """Renders pdfs on a pool of worker processes, so layout doesn't block web workers and sheets render in parallel."""
+
+    def __init__(self, max_workers=RENDER_WORKERS, max_queue=RENDER_QUEUE_DEPTH, queue_timeout=RENDER_QUEUE_TIMEOUT, render=write_pdf, initializer=warm_up_worker):
+        """With max_workers of 0 pdfs are rendered in the calling thread.  max_queue limits the jobs waiting or running at once."""
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.render = render
+        self.initializer = initializer
+        self._slots = threading.BoundedSemaphore(max_queue)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def get_executor(self):
+        """Get the process pool, starting it the first time, after a fork or after a worker died.  Workers are spawned so they don't inherit threads."""
+        with self._lock:
+            # A pool whose worker died is unusable, so start a new one.
+            if self._executor is None or self._pid != os.getpid() or getattr(self._executor, '_broken', False):
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=self.initializer,
+                    )
+                self._pid = os.getpid()
+                self._slots = threading.BoundedSemaphore(self.max_queue)
+        return self._executor
+
+    def submit(self, html, base_url=None):
+        """Queue html to be rendered and return a future for the pdf bytes.  Raises RenderQueueFull if the queue stays full."""
+        if self.max_workers == 0:
+            future = Future()
+            try:
+                future.set_result(self.render(html, base_url))
+            except Exception as error:
+                future.set_exception(error)
+            return future
+
+        executor = self.get_executor()
+        slots = self._slots
+        if not slots.acquire(timeout=self.queue_timeout):
+            raise RenderQueueFull(f'More than {self.max_queue} pdfs are waiting to be rendered.')
+        try:
+            future = executor.submit(self.render, html, base_url)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda future: slots.release())
+        return future
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+
+render_service = RenderService()
@@ -1,15 +1,102 @@
-
 import boto3
-from config import S3_BUCKET, S3_KEY, S3_SECRET
+import io
+import os
+import threading
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from headers import content_disposition
+from config import (S3_BUCKET, S3_KEY, S3_SECRET, S3_MAX_POOL_CONNECTIONS, S3_MAX_ATTEMPTS,
+                    S3_CONNECT_TIMEOUT, S3_READ_TIMEOUT, S3_PRESIGNED_EXPIRES, DOWNLOAD_CHUNK_SIZE)
+
+# Most keys S3 will delete in one multi-object delete call.
+S3_DELETE_BATCH_SIZE = 1000
+
+S3_CONFIG = Config(
+    max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+    retries={'max_attempts': S3_MAX_ATTEMPTS, 'mode': 'standard'},
+    connect_timeout=S3_CONNECT_TIMEOUT,
+    read_timeout=S3_READ_TIMEOUT,
+    )
+
+# boto3 sessions and resources are not safe to share between threads or forked processes, so they are cached per process and per thread.
+_boto_session = None
+_boto_session_pid = None
+_boto_session_lock = threading.Lock()
+_local = threading.local()
+
+def get_boto_session():
+    """Get the boto3 session for this process, creating it the first time or after a fork."""
+    global _boto_session, _boto_session_pid
+    with _boto_session_lock:
+        if _boto_session is None or _boto_session_pid != os.getpid():
+            if S3_KEY and S3_SECRET:
+                _boto_session = boto3.session.Session(aws_access_key_id=S3_KEY, aws_secret_access_key=S3_SECRET)
+            else:
+                _boto_session = boto3.session.Session()
+            _boto_session_pid = os.getpid()
+        return _boto_session
 
 def get_s3_resource():
-    """Set up S3 resource."""
-    if S3_KEY and S3_SECRET:
-        return boto3.resource('s3', aws_access_key_id=S3_KEY, aws_secret_access_key=S3_SECRET)
-    else:
-        return boto3.resource('s3')
-    
+    """Set up S3 resource.  The resource is created once per thread and reused by later requests."""
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.resource = get_boto_session().resource('s3', config=S3_CONFIG)
+        _local.bucket = _local.resource.Bucket(S3_BUCKET)
+        _local.pid = os.getpid()
+    return _local.resource
+
 def get_bucket():
     """Get S3 bucket using S3 resource."""
-    s3_resource = get_s3_resource()
-    return s3_resource.Bucket(S3_BUCKET)
\ No newline at end of file
+    get_s3_resource()
+    return _local.bucket
+
+def get_s3_client():
+    """Get the low level S3 client behind the cached S3 resource."""
+    return get_s3_resource().meta.client
+
+def upload_pdf(bucket, pdf, key):
+    """Upload pdf bytes to the bucket straight from memory."""
+    bucket.upload_fileobj(io.BytesIO(pdf), key, ExtraArgs={'ContentType': 'application/pdf'})
+
+def stream_body(body, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield an S3 object body in chunks, closing the connection when done so it goes back to the pool."""
+    try:
+        yield from body.iter_chunks(chunk_size)
+    finally:
+        body.close()
+
+def get_presigned_url(key, filename, expires=S3_PRESIGNED_EXPIRES):
+    """Short lived url that downloads a pdf straight from S3."""
+    return get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': S3_BUCKET,
+            'Key': key,
+            'ResponseContentType': 'application/pdf',
+            'ResponseContentDisposition': content_disposition(filename),
+            },
+        ExpiresIn=expires,
+        )
+
+def delete_objects(keys, client=None):
+    """Delete keys from the S3 bucket with multi-object deletes of up to 1000 keys each.  Returns the keys that could not be deleted."""
+    keys = list(keys)
+    if not keys:
+        return []
+    if client is None:
+        client = get_s3_client()
+    failed = []
+    for start in range(0, len(keys), S3_DELETE_BATCH_SIZE):
+        batch = keys[start:start + S3_DELETE_BATCH_SIZE]
+        response = client.delete_objects(
+            Bucket=S3_BUCKET,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+        failed.extend(error['Key'] for error in response.get('Errors', []))
+    return failed
+
+def list_objects(client=None):
+    """Yield every object in the S3 bucket as a dict with its Key and LastModified."""
+    if client is None:
+        client = get_s3_client()
+    for page in client.get_paginator('list_objects_v2').paginate(Bucket=S3_BUCKET):
+        yield from page.get('Contents', [])
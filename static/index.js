@@ -11,11 +11,16 @@ $(document).ready(function () {
 });
 
 // On submit, disable the form submission button and show a loading spinner.
-$("#new-worksheet-form").on("submit", function () {
+// Class sets download as a zip without leaving the page, so their button is left alone.
+$("#new-worksheet-form").on("submit", function (event) {
+	const submitter = event.originalEvent && event.originalEvent.submitter;
+	if (submitter && submitter.id === "class-set-button") {
+		return;
+	}
 	buttonLoading = $(
 		'<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span>'
 	);
-	submitButton = $("#new-worksheet-form button");
+	submitButton = $("#new-worksheet-form button").not("#class-set-button");
 	submitButton
 		.text("Loading...  ")
 		.append(buttonLoading)
@@ -1,5 +1,5 @@
 // On submit, disable the form submission button and show a loading spinner.
-$("form.delete-form").on("submit", function () {
+$("form.delete-form, form.bulk-delete-form").on("submit", function () {
 	buttonLoading = $(
 		'<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span>'
 	);
@@ -9,3 +9,56 @@ $("form.delete-form").on("submit", function () {
 		.append(buttonLoading)
 		.prop("disabled", true);
 });
+
+// Only enable the bulk delete button when files are selected.
+function updateBulkDelete() {
+	const selected = $(".select-file:checked").length;
+	$(".bulk-delete-form button").prop("disabled", selected === 0);
+	$(".select-all-files").each(function () {
+		const $files = $(".select-file", $(this).closest("table"));
+		$(this).prop(
+			"checked",
+			$files.length > 0 && $files.filter(":checked").length === $files.length
+		);
+	});
+}
+
+$(".select-all-files").on("change", function () {
+	$(".select-file", $(this).closest("table")).prop(
+		"checked",
+		$(this).prop("checked")
+	);
+	updateBulkDelete();
+});
+
+$(".select-file").on("change", updateBulkDelete);
+
+// Poll the status of worksheets that are still being saved.  Reload the page when one is done to show the new files.
+const POLL_INTERVAL = 2000;
+
+function pollSaveJob($job) {
+	axios
+		.get($job.data("status-url"))
+		.then((resp) => {
+			const job = resp.data.job;
+			if (job.status === "done") {
+				window.location.reload();
+			} else if (job.status === "failed") {
+				$job.removeClass("alert-info").addClass("alert-danger");
+				$(".spinner-border", $job).remove();
+				$(".save-job-message", $job).text(job.error);
+			} else {
+				setTimeout(() => pollSaveJob($job), POLL_INTERVAL);
+			}
+		})
+		.catch(() => setTimeout(() => pollSaveJob($job), POLL_INTERVAL));
+}
+
+$(".save-job").each(function () {
+	pollSaveJob($(this));
+});
+
+// Reload the list with the new page size as soon as one is picked.
+$(".page-size-form select").on("change", function () {
+	$(this).closest("form").trigger("submit");
+});
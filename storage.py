@@ -0,0 +1,288 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+from werkzeug.http import parse_range_header
+
+from config import STORAGE_BACKEND, LOCAL_STORAGE_DIR, DOWNLOAD_CHUNK_SIZE
+from metrics import metrics
+
+class StorageError(Exception):
+    """Base class for errors reading from storage."""
+
+class ObjectNotFound(StorageError):
+    """Raised when a key is not in storage."""
+
+class NotModified(StorageError):
+    """Raised when the stored object still matches the etag the client has."""
+
+    def __init__(self, etag):
+        super().__init__(etag)
+        self.etag = etag
+
+class InvalidRange(StorageError):
+    """Raised when a requested byte range is outside the stored object."""
+
+    def __init__(self, size):
+        super().__init__(size)
+        self.size = size
+
+class StoredObject:
+    """An object read from storage.  body yields the bytes in chunks."""
+
+    def __init__(self, body, content_length, etag, content_range=None):
+        self.body = body
+        self.content_length = content_length
+        self.etag = etag
+        self.content_range = content_range
+
+class StorageBackend(ABC):
+    """Interface for where saved pdfs are kept.  Backends must implement every method except presigned_url."""
+
+    @abstractmethod
+    def put(self, key, data):
+        """Store pdf bytes under key."""
+
+    @abstractmethod
+    def open(self, key, byte_range=None, if_none_match=None):
+        """Open a stored object for streaming.  byte_range is an HTTP Range header value."""
+
+    @abstractmethod
+    def delete_many(self, keys):
+        """Delete keys.  Returns the keys that could not be deleted."""
+
+    @abstractmethod
+    def metadata(self, key):
+        """Get a dict with the size, etag and last_modified time of a stored object."""
+
+    @abstractmethod
+    def list(self):
+        """Yield every stored object as a dict with its Key and LastModified."""
+
+    def presigned_url(self, key, filename):
+        """Url the client can download the object from directly, or None if the backend can't make one."""
+        return None
+
+def get_byte_range(byte_range, size):
+    """Parse an HTTP Range header value into (start, stop) for an object of size bytes, or None for the whole object."""
+    if not byte_range:
+        return None
+    parsed = parse_range_header(byte_range)
+    if parsed is None:
+        return None
+    span = parsed.range_for_length(size)
+    if span is None:
+        raise InvalidRange(size)
+    return span
+
+def iter_chunks(file, start, stop, chunk_size=DOWNLOAD_CHUNK_SIZE):
+    """Yield bytes start to stop of an open file in chunks, closing the file when done."""
+    try:
+        file.seek(start)
+        remaining = stop - start
+        while remaining > 0:
+            chunk = file.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+def open_local(file, size, etag, byte_range, if_none_match):
+    """Open a local file for streaming with the same range and etag handling as S3."""
+    if if_none_match and if_none_match == etag:
+        file.close()
+        raise NotModified(etag)
+    try:
+        span = get_byte_range(byte_range, size)
+    except InvalidRange:
+        file.close()
+        raise
+    if span is None:
+        return StoredObject(iter_chunks(file, 0, size), size, etag)
+    start, stop = span
+    return StoredObject(iter_chunks(file, start, stop), stop - start, etag, f'bytes {start}-{stop - 1}/{size}')
+
+class S3Storage(StorageBackend):
+    """Stores pdfs in the S3 bucket.  boto3 is only imported when this backend is created."""
+
+    def __init__(self):
+        import resources
+        self.resources = resources
+
+    @metrics.timed('storage')
+    def put(self, key, data):
+        self.resources.upload_pdf(self.resources.get_bucket(), data, key)
+
+    @metrics.timed('storage')
+    def open(self, key, byte_range=None, if_none_match=None):
+        # Pass the range and etag headers on to S3, which handles partial and unchanged responses.
+        get_args = dict()
+        if byte_range:
+            get_args['Range'] = byte_range
+        if if_none_match:
+            get_args['IfNoneMatch'] = if_none_match
+
+        try:
+            file_obj = self.resources.get_bucket().Object(key).get(**get_args)
+        except self.resources.ClientError as error:
+            code = error.response['Error']['Code']
+            if code == '304':
+                raise NotModified(if_none_match)
+            if code == 'InvalidRange':
+                raise InvalidRange(error.response['Error'].get('ActualObjectSize', '*'))
+            if code in ('NoSuchKey', '404'):
+                raise ObjectNotFound(key)
+            raise
+
+        return StoredObject(self.resources.stream_body(file_obj['Body']), file_obj['ContentLength'], file_obj['ETag'], file_obj.get('ContentRange'))
+
+    @metrics.timed('storage')
+    def delete_many(self, keys):
+        return self.resources.delete_objects(keys)
+
+    @metrics.timed('storage')
+    def metadata(self, key):
+        try:
+            head = self.resources.get_s3_client().head_object(Bucket=self.resources.S3_BUCKET, Key=key)
+        except self.resources.ClientError as error:
+            if error.response['Error']['Code'] in ('NoSuchKey', '404'):
+                raise ObjectNotFound(key)
+            raise
+        return {'size': head['ContentLength'], 'etag': head['ETag'], 'last_modified': head['LastModified']}
+
+    def list(self):
+        return self.resources.list_objects()
+
+    def presigned_url(self, key, filename):
+        return self.resources.get_presigned_url(key, filename)
+
+class LocalStorage(StorageBackend):
+    """Stores pdfs as files in a local directory.  For small deployments that don't need S3, and for benchmarks."""
+
+    def __init__(self, directory=LOCAL_STORAGE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        """Path of the file for key.  Keys can't reach outside the storage directory."""
+        if os.path.basename(key) != key or key in ('', '.', '..'):
+            raise ObjectNotFound(key)
+        return os.path.join(self.directory, key)
+
+    @staticmethod
+    def _etag(stat):
+        """Etag from the size and modified time of a file."""
+        return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    @metrics.timed('storage')
+    def put(self, key, data):
+        # Write to a temporary file first so readers never see a partial pdf.
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, self._path(key))
+
+    @metrics.timed('storage')
+    def open(self, key, byte_range=None, if_none_match=None):
+        try:
+            file = open(self._path(key), 'rb')
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        stat = os.fstat(file.fileno())
+        return open_local(file, stat.st_size, self._etag(stat), byte_range, if_none_match)
+
+    @metrics.timed('storage')
+    def delete_many(self, keys):
+        failed = []
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            except (OSError, ObjectNotFound):
+                failed.append(key)
+        return failed
+
+    @metrics.timed('storage')
+    def metadata(self, key):
+        try:
+            stat = os.stat(self._path(key))
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        return {'size': stat.st_size, 'etag': self._etag(stat), 'last_modified': datetime.fromtimestamp(stat.st_mtime, timezone.utc)}
+
+    def list(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                yield {'Key': entry.name, 'LastModified': datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc)}
+
+class MemoryStorage(StorageBackend):
+    """Stores pdfs in a dict in this process.  Each worker has its own copy, so this is only for tests and benchmarks."""
+
+    def __init__(self):
+        self._objects = dict()
+        self._lock = threading.Lock()
+
+    def put(self, key, data):
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self._lock:
+            self._objects[key] = (bytes(data), etag, datetime.now(timezone.utc))
+
+    def _get(self, key):
+        """Get the (data, etag, last_modified) tuple for key."""
+        with self._lock:
+            stored = self._objects.get(key)
+        if stored is None:
+            raise ObjectNotFound(key)
+        return stored
+
+    def open(self, key, byte_range=None, if_none_match=None):
+        data, etag, last_modified = self._get(key)
+        return open_local(io.BytesIO(data), len(data), etag, byte_range, if_none_match)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._objects.pop(key, None)
+        return []
+
+    def metadata(self, key):
+        data, etag, last_modified = self._get(key)
+        return {'size': len(data), 'etag': etag, 'last_modified': last_modified}
+
+    def list(self):
+        with self._lock:
+            objects = list(self._objects.items())
+        for key, (data, etag, last_modified) in objects:
+            yield {'Key': key, 'LastModified': last_modified}
+
+BACKENDS = {
+    's3': S3Storage,
+    'local': LocalStorage,
+    'memory': MemoryStorage,
+}
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage():
+    """Get the storage backend picked by STORAGE_BACKEND, creating it the first time."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            if STORAGE_BACKEND not in BACKENDS:
+                raise ValueError(f'Unknown storage backend: {STORAGE_BACKEND}')
+            _storage = BACKENDS[STORAGE_BACKEND]()
+        return _storage
+
+def set_storage(storage):
+    """Replace the storage backend, for tests and benchmarks."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
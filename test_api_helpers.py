@@ -0,0 +1,84 @@
+from unittest import IsolatedAsyncioTestCase
+import asyncio
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import api_helpers
+from api_helpers import get_math_data, MathAPIError
+from question_generator import generate_questions
+
+QUESTION = {'answer': 30, 'expression': '45 - 15', 'first': 45, 'operation': '-', 'second': 15}
+
+class MathAPITestCase(IsolatedAsyncioTestCase):
+    """Test calling the math api with a local stand-in server."""
+
+    async def asyncSetUp(self):
+        """Start a local math api that fails or stalls on some calls."""
+        self.calls = 0
+
+        async def handler(request):
+            self.calls += 1
+            mode = request.match_info['operations']
+            if mode == 'flaky' and self.calls <= 3:
+                return web.Response(status=500)
+            if mode == 'slow':
+                await asyncio.sleep(10)
+            if mode == 'steady':
+                await asyncio.sleep(0.06)
+            return web.json_response(QUESTION)
+
+        app = web.Application()
+        app.router.add_get('/{operations}', handler)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.url = str(self.server.make_url('')).rstrip('/')
+        self.session = aiohttp.ClientSession()
+
+        self.old_settings = (api_helpers.MATH_API_DEADLINE, api_helpers.MATH_API_HEDGE_DELAY, api_helpers.MATH_API_RETRY_BACKOFF, api_helpers.MATH_API_CONCURRENCY)
+        api_helpers.MATH_API_DEADLINE = 0.5
+        api_helpers.MATH_API_HEDGE_DELAY = 0.1
+        api_helpers.MATH_API_RETRY_BACKOFF = 0.01
+
+    async def asyncTearDown(self):
+        """Stop the local server and restore the settings."""
+        api_helpers.MATH_API_DEADLINE, api_helpers.MATH_API_HEDGE_DELAY, api_helpers.MATH_API_RETRY_BACKOFF, api_helpers.MATH_API_CONCURRENCY = self.old_settings
+        await self.session.close()
+        await self.server.close()
+
+    async def test_get_math_data(self):
+        """Are all questions returned when the api is healthy?"""
+        results = await get_math_data(self.url, 'sub', 10, {'min': 0, 'max': 100}, session=self.session)
+
+        self.assertEqual(results, [QUESTION] * 10)
+
+    async def test_no_hedge_while_queued(self):
+        """Are calls waiting for a concurrency slot left alone when the api answers quickly?"""
+        api_helpers.MATH_API_CONCURRENCY = 10
+        api_helpers.MATH_API_DEADLINE = 2
+        results = await get_math_data(self.url, 'steady', 30, {'min': 0, 'max': 100}, session=self.session)
+
+        self.assertEqual(results, [QUESTION] * 30)
+        self.assertEqual(self.calls, 30)
+
+    async def test_retries(self):
+        """Are failed calls retried?"""
+        results = await get_math_data(self.url, 'flaky', 5, {'min': 0, 'max': 100}, session=self.session)
+
+        self.assertEqual(results, [QUESTION] * 5)
+        self.assertGreater(self.calls, 5)
+
+    async def test_deadline_backfill(self):
+        """Are questions that miss the deadline generated locally?"""
+        results = await get_math_data(self.url, 'slow', 5, {'min': 0, 'max': 100}, session=self.session, backfill=lambda operations, n, params: generate_questions('add', n, params))
+
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result['operation'] == '+' for result in results))
+        # Every slow call was hedged with a duplicate.
+        self.assertEqual(self.calls, 10)
+
+    async def test_deadline_without_backfill(self):
+        """Is an error raised when questions miss the deadline and there is nothing to backfill with?"""
+        with self.assertRaises(MathAPIError):
+            await get_math_data(self.url, 'slow', 5, {'min': 0, 'max': 100}, session=self.session)
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+from benchmarks import measure, compare_results, result
+
+class BenchmarksTestCase(TestCase):
+    """Test timing benchmarks and comparing runs."""
+    
+    def test_measure(self):
+        """Are warm up runs left out of the timings, and is setup passed to each run?"""
+        calls = []
+        timings = measure(calls.append, repeat=3, warmup=2, setup=lambda: (len(calls),))
+        
+        self.assertEqual(calls, [0, 1, 2, 3, 4])
+        self.assertEqual(timings['runs'], 3)
+        self.assertLessEqual(timings['min_ms'], timings['median_ms'])
+        self.assertLessEqual(timings['median_ms'], timings['max_ms'])
+        
+    def test_compare_results(self):
+        """Are only benchmarks that got slower by more than the threshold reported?"""
+        baseline = {'results': [
+            result('pdf.grid', {'questions': 5}, {'median_ms': 1.0}),
+            result('pdf.grid', {'questions': 30}, {'median_ms': 2.0}),
+            result('pdf.weasyprint', {'questions': 5}, {'skipped': 'no cairo'}),
+            ]}
+        current = {'results': [
+            result('pdf.grid', {'questions': 5}, {'median_ms': 1.1}),
+            result('pdf.grid', {'questions': 30}, {'median_ms': 3.0}),
+            result('pdf.weasyprint', {'questions': 5}, {'median_ms': 50.0}),
+            result('template', {'questions': 5}, {'median_ms': 9.0}),
+            ]}
+        
+        self.assertEqual(compare_results(baseline, current, threshold=0.2), [('pdf.grid', {'questions': 30}, 2.0, 3.0)])
+        
+    def test_import_leaves_bcrypt_rounds(self):
+        """Does importing the benchmarks leave the bcrypt cost of everything else in the process alone?"""
+        env = {name: value for name, value in os.environ.items() if name != 'BCRYPT_ROUNDS'}
+        code = 'import benchmarks, config; print(config.BCRYPT_ROUNDS)'
+        output = subprocess.run([sys.executable, '-c', code], env=env, cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout
+        
+        self.assertEqual(output.strip(), '12')
@@ -0,0 +1,45 @@
+from unittest import TestCase
+from datetime import datetime, timedelta, timezone
+
+from cleanup import find_orphaned_keys
+from resources import delete_objects
+
+class FakeS3Client:
+    """Stand in for the S3 client that records multi-object deletes."""
+
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def delete_objects(self, Bucket, Delete):
+        keys = [obj['Key'] for obj in Delete['Objects']]
+        self.calls.append(keys)
+        return {'Errors': [{'Key': key} for key in keys if key in self.failing]}
+
+class CleanupTestCase(TestCase):
+    """Test bulk deletes and orphan reconciliation."""
+
+    def test_delete_objects_batches(self):
+        """Are keys deleted in batches of at most 1000?"""
+        client = FakeS3Client()
+        failed = delete_objects([f'{i}.pdf' for i in range(2500)], client=client)
+
+        self.assertEqual(failed, [])
+        self.assertEqual([len(keys) for keys in client.calls], [1000, 1000, 500])
+
+    def test_delete_objects_errors(self):
+        """Are keys that could not be deleted returned?"""
+        client = FakeS3Client(failing=['b.pdf'])
+
+        self.assertEqual(delete_objects(['a.pdf', 'b.pdf'], client=client), ['b.pdf'])
+
+    def test_find_orphaned_keys(self):
+        """Are only old objects without a PDF row found?"""
+        now = datetime(2022, 5, 1, tzinfo=timezone.utc)
+        objects = [
+            {'Key': 'saved.pdf', 'LastModified': now - timedelta(days=1)},
+            {'Key': 'orphan.pdf', 'LastModified': now - timedelta(days=1)},
+            {'Key': 'uploading.pdf', 'LastModified': now - timedelta(seconds=10)},
+        ]
+
+        self.assertEqual(find_orphaned_keys(['saved.pdf'], objects, grace_period=3600, now=now), ['orphan.pdf'])
@@ -0,0 +1,24 @@
+from unittest import TestCase
+
+from api_helpers import get_math_data, run_in_loop
+from fake_math_api import FakeMathAPI
+
+class FakeMathAPITestCase(TestCase):
+    """Test the local stand-in for the math api."""
+    
+    def setUp(self):
+        self.api = FakeMathAPI()
+        self.api.start()
+        
+    def tearDown(self):
+        self.api.stop()
+        
+    def test_questions(self):
+        """Does the math api client get questions in range from the stand-in?"""
+        questions = run_in_loop(get_math_data(self.api.url, 'add', 5, {'min': 1, 'max': 9}))
+        
+        self.assertEqual(len(questions), 5)
+        for question in questions:
+            self.assertEqual(question['operation'], '+')
+            self.assertTrue(1 <= question['first'] <= 9)
+            self.assertEqual(question['answer'], question['first'] + question['second'])
@@ -0,0 +1,75 @@
+import re
+import zlib
+from unittest import TestCase
+
+from grid_pdf import write_sheet_pdf
+
+QUESTIONS = [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2}, 
+             {'answer': 1440, 'expression': '40 * 36', 'first': 40, 'operation': '*', 'second': 36}, 
+             {'answer': 30, 'expression': '45 - 15', 'first': 45, 'operation': '-', 'second': 15}]
+
+def page_text(pdf):
+    """(x, y, text) of each piece of text on each page of a pdf, read from its compressed content streams."""
+    pages = []
+    for stream in re.findall(rb'stream\n(.*?)\nendstream', pdf, re.S):
+        content = zlib.decompress(stream).decode('latin-1')
+        texts = re.findall(r'1 0 0 1 ([\d.]+) ([\d.]+) Tm\n\[\((.*?)\)\] TJ', content)
+        pages.append([(float(x), float(y), re.sub(r'\\(.)', r'\1', text)) for x, y, text in texts])
+    return pages
+
+class GridPDFTestCase(TestCase):
+    """Test writing worksheets straight to pdf."""
+    
+    def test_worksheet(self):
+        """Is a worksheet a one page pdf?"""
+        pdf = write_sheet_pdf('worksheet', QUESTIONS)
+        
+        self.assertTrue(pdf.startswith(b'%PDF-'))
+        self.assertTrue(pdf.rstrip().endswith(b'%%EOF'))
+        self.assertIn(b'/Title (Worksheet)', pdf)
+        self.assertEqual(pdf.count(b'/Type /Page\n'), 1)
+        
+    def test_answer_key(self):
+        """Is the answer key titled as one?"""
+        pdf = write_sheet_pdf('answer-key', QUESTIONS)
+        
+        self.assertIn(b'/Title (Answer Key)', pdf)
+        
+    def test_page_break(self):
+        """Do questions that don't fit on a page continue on the next one?"""
+        pdf = write_sheet_pdf('worksheet', QUESTIONS * 30)
+        
+        self.assertEqual(pdf.count(b'/Type /Page\n'), 3)
+        
+    def test_worksheet_text(self):
+        """Does a worksheet have a Name and Date line above the numbered questions, without the answers?"""
+        [page] = page_text(write_sheet_pdf('worksheet', QUESTIONS))
+        
+        self.assertEqual([text for x, y, text in page], ['Name: ' + '_' * 40, 'Date: ' + '_' * 11, '1) 88 / 2 =', '2) 40 * 36 =', '3) 45 - 15 ='])
+        (name_x, name_y, _), (date_x, date_y, _), (first_x, first_y, _), (second_x, second_y, _), (third_x, third_y, _) = page
+        self.assertEqual(name_y, date_y)
+        self.assertLess(name_x, date_x)
+        self.assertLess(first_y, name_y)
+        # Two questions to a row, like the col-6 grid in the template.
+        self.assertEqual(first_y, second_y)
+        self.assertEqual(first_x, third_x)
+        self.assertLess(third_y, first_y)
+        
+    def test_answer_key_text(self):
+        """Does an answer key have a heading and the numbered questions with their answers?"""
+        [page] = page_text(write_sheet_pdf('answer-key', QUESTIONS))
+        
+        self.assertEqual([text for x, y, text in page], ['Answer Key', '1) 88 / 2 = 44', '2) 40 * 36 = 1440', '3) 45 - 15 = 30'])
+        
+    def test_page_break_text(self):
+        """Is the numbering carried on across pages, with every question written once?"""
+        pages = page_text(write_sheet_pdf('answer-key', QUESTIONS * 30))
+        texts = [text for page in pages for x, y, text in page]
+        
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(texts[1:], [f"{i}) {question['expression']} = {question['answer']}" for i, question in enumerate(QUESTIONS * 30, start=1)])
+        
+    def test_unknown_sheet(self):
+        """Are only worksheets and answer keys rendered?"""
+        with self.assertRaises(KeyError):
+            write_sheet_pdf('cover-letter', QUESTIONS)
@@ -0,0 +1,23 @@
+from unittest import TestCase
+from headers import content_disposition
+
+class ContentDispositionTestCase(TestCase):
+    """Test the Content-Disposition header for downloads."""
+
+    def test_plain_name(self):
+        """Is a plain name used as is?"""
+        self.assertEqual(content_disposition('Test - Worksheet.pdf'), "attachment; filename=\"Test - Worksheet.pdf\"; filename*=UTF-8''Test%20-%20Worksheet.pdf")
+
+    def test_quotes(self):
+        """Are quotes, backslashes and line breaks kept out of the header?"""
+        header = content_disposition('My "Best"\\\r\nSheet.pdf')
+
+        self.assertTrue(header.startswith('attachment; filename="My BestSheet.pdf"; '))
+        self.assertIn("filename*=UTF-8''My%20%22Best%22%5C%0D%0ASheet.pdf", header)
+
+    def test_unicode(self):
+        """Are accented names readable in the ASCII filename and kept whole in filename*?"""
+        header = content_disposition('Café ✓.pdf')
+
+        self.assertIn('filename="Cafe .pdf"', header)
+        self.assertIn("filename*=UTF-8''Caf%C3%A9%20%E2%9C%93.pdf", header)
@@ -0,0 +1,23 @@
+from unittest import TestCase
+
+from import_report import parse_importtime
+
+OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       225 |        225 |   _io
+import time:       543 |       2135 |   os
+import time:        30 |      82677 |     sqlalchemy.sql
+import time:      1137 |     182862 |   sqlalchemy
+import time:      8012 |     671222 | app
+"""
+
+class ImportReportTestCase(TestCase):
+    """Test parsing python -X importtime output."""
+    
+    def test_parse_importtime(self):
+        """Are the module, depth and times read from each line?"""
+        imports = parse_importtime(OUTPUT)
+        
+        self.assertEqual(imports[0], ('_io', 1, 225, 225))
+        self.assertEqual(imports[2], ('sqlalchemy.sql', 2, 30, 82677))
+        self.assertEqual(imports[-1], ('app', 0, 8012, 671222))
+        self.assertEqual(len(imports), 5)
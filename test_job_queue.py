@@ -0,0 +1,40 @@
+from unittest import TestCase
+
+from job_queue import JobQueue, JobQueueFull
+
+class JobQueueTestCase(TestCase):
+    """Test the background job queue."""
+
+    def test_enqueue(self):
+        """Are queued jobs handled on the worker threads?"""
+        handled = []
+        jobs = JobQueue(lambda a, b: handled.append(a + b), workers=2, max_size=10)
+        for i in range(5):
+            jobs.enqueue(i, 1)
+        jobs.join()
+
+        self.assertEqual(sorted(handled), [1, 2, 3, 4, 5])
+
+    def test_failed_job(self):
+        """Does a failed job leave the workers running?"""
+        handled = []
+
+        def handler(value):
+            if value == 'fail':
+                raise ValueError(value)
+            handled.append(value)
+
+        jobs = JobQueue(handler, workers=1, max_size=10)
+        jobs.enqueue('fail')
+        jobs.enqueue('ok')
+        jobs.join()
+
+        self.assertEqual(handled, ['ok'])
+
+    def test_queue_full(self):
+        """Is an error raised when the queue is full?"""
+        jobs = JobQueue(lambda: None, workers=0, max_size=1)
+        jobs.enqueue()
+
+        with self.assertRaises(JobQueueFull):
+            jobs.enqueue()
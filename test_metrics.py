@@ -0,0 +1,65 @@
+from unittest import TestCase
+
+from jinja2 import Environment, DictLoader
+
+from metrics import Metrics, instrument_templates
+
+class FakeClock:
+    """Clock that only moves when told to."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+class MetricsTestCase(TestCase):
+    """Test timing stages and requests."""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.metrics = Metrics(clock=self.clock)
+    
+    def test_span(self):
+        """Are stages timed, counted as in flight while they run, and counted as errors when they raise?"""
+        with self.metrics.span('db'):
+            self.clock.now += 0.003
+            self.assertIn('worksheet_stage_in_flight{stage="db"} 1', self.metrics.render())
+        with self.assertRaises(KeyError):
+            with self.metrics.span('db'):
+                raise KeyError('missing')
+        
+        text = self.metrics.render()
+        self.assertIn('worksheet_stage_in_flight{stage="db"} 0', text)
+        self.assertIn('worksheet_stage_seconds_bucket{stage="db",le="0.001"} 1', text)
+        self.assertIn('worksheet_stage_seconds_bucket{stage="db",le="0.005"} 2', text)
+        self.assertIn('worksheet_stage_seconds_bucket{stage="db",le="+Inf"} 2', text)
+        self.assertIn('worksheet_stage_seconds_sum{stage="db"} 0.003000', text)
+        self.assertIn('worksheet_stage_seconds_count{stage="db"} 2', text)
+        self.assertIn('worksheet_stage_errors_total{stage="db"} 1', text)
+    
+    def test_request_trace(self):
+        """Are stages added to the request that started them, even when they finish after it moved on?"""
+        trace = self.metrics.start_request()
+        with self.metrics.span('db'):
+            self.clock.now += 0.002
+        token = self.metrics.start('pdf_weasyprint')
+        self.clock.now += 0.010
+        self.metrics.finish(token)
+        self.assertEqual(self.metrics.finish_request(trace, 'upload', 302), 0.012)
+        
+        with self.metrics.span('db'):
+            pass
+        
+        self.assertEqual(trace.summary(), 'pdf_weasyprint 1x 10.0 ms, db 1x 2.0 ms')
+        text = self.metrics.render()
+        self.assertIn('worksheet_request_seconds_count{endpoint="upload",status="302"} 1', text)
+        self.assertIn('worksheet_requests_in_flight 0', text)
+    
+    def test_instrument_templates(self):
+        """Is each template rendered timed once, not once more for each include?"""
+        environment = Environment(loader=DictLoader({'page.html': 'a{% include "part.html" %}', 'part.html': 'b'}))
+        instrument_templates(environment, self.metrics)
+        
+        self.assertEqual(environment.get_template('page.html').render(), 'ab')
+        self.assertIn('worksheet_stage_seconds_count{stage="template"} 1', self.metrics.render())
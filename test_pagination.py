@@ -0,0 +1,26 @@
+from unittest import TestCase
+from datetime import datetime
+
+from pagination import encode_cursor, decode_cursor
+
+class Row:
+    """Stand in for a row with a timestamp and id."""
+    
+    def __init__(self, timestamp, id):
+        self.timestamp = timestamp
+        self.id = id
+
+class PaginationTestCase(TestCase):
+    """Test keyset pagination cursors."""
+    
+    def test_cursor_round_trip(self):
+        """Does a cursor decode back to the timestamp and id of its row?"""
+        timestamp = datetime(2022, 3, 4, 5, 6, 7, 890)
+        self.assertEqual(decode_cursor(encode_cursor(Row(timestamp, 42))), (timestamp, 42))
+        
+    def test_invalid_cursor(self):
+        """Are missing and malformed cursors ignored?"""
+        self.assertIsNone(decode_cursor(None))
+        self.assertIsNone(decode_cursor(''))
+        self.assertIsNone(decode_cursor('yesterday_1'))
+        self.assertIsNone(decode_cursor('2022-03-04T05:06:07_x'))
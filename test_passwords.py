@@ -0,0 +1,91 @@
+import threading
+from unittest import TestCase
+
+from passwords import PasswordHasher, PasswordQueueFull, LoginThrottle, get_rounds
+
+class FakeClock:
+    """Clock that only moves when told to."""
+    
+    def __init__(self):
+        self.now = 0
+        
+    def __call__(self):
+        return self.now
+
+class PasswordHasherTestCase(TestCase):
+    """Test hashing passwords on the thread pool."""
+    
+    def test_hash_and_check(self):
+        """Does a hashed password check out, and a wrong one not?"""
+        hasher = PasswordHasher(rounds=4, workers=1)
+        hashed = hasher.hash('GreatPassword123')
+        
+        self.assertEqual(get_rounds(hashed), 4)
+        self.assertTrue(hasher.check(hashed, 'GreatPassword123'))
+        self.assertFalse(hasher.check(hashed, 'WrongPassword'))
+        
+    def test_needs_rehash(self):
+        """Is a hash made with a different cost factor rehashed?"""
+        hashed = PasswordHasher(rounds=4, workers=0).hash('GreatPassword123')
+        
+        self.assertFalse(PasswordHasher(rounds=4, workers=0).needs_rehash(hashed))
+        self.assertTrue(PasswordHasher(rounds=5, workers=0).needs_rehash(hashed))
+        
+    def test_queue_full(self):
+        """Is PasswordQueueFull raised when the queue stays full?"""
+        hasher = PasswordHasher(workers=1, max_queue=1, queue_timeout=0.01)
+        started = threading.Event()
+        release = threading.Event()
+        
+        def block():
+            started.set()
+            release.wait()
+        
+        thread = threading.Thread(target=hasher.run, args=(block,))
+        thread.start()
+        started.wait()
+        try:
+            with self.assertRaises(PasswordQueueFull):
+                hasher.run(lambda: None)
+        finally:
+            release.set()
+            thread.join()
+        self.assertEqual(hasher.run(lambda: 'done'), 'done')
+
+class LoginThrottleTestCase(TestCase):
+    """Test locking out usernames after failed logins."""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.throttle = LoginThrottle(max_failures=3, window=60, max_usernames=2, clock=self.clock)
+        
+    def test_throttled(self):
+        """Is a username locked out after too many failures until they expire?"""
+        for i in range(3):
+            self.assertFalse(self.throttle.is_throttled('JaneDoe'))
+            self.throttle.record_failure('JaneDoe')
+            self.clock.now += 10
+        
+        self.assertTrue(self.throttle.is_throttled('JaneDoe'))
+        self.assertFalse(self.throttle.is_throttled('JohnSmith'))
+        
+        self.clock.now = 60
+        self.assertFalse(self.throttle.is_throttled('JaneDoe'))
+        
+    def test_reset(self):
+        """Does logging in forget earlier failures?"""
+        for i in range(3):
+            self.throttle.record_failure('JaneDoe')
+        self.throttle.reset('JaneDoe')
+        
+        self.assertFalse(self.throttle.is_throttled('JaneDoe'))
+        
+    def test_max_usernames(self):
+        """Are the usernames that failed longest ago forgotten first?"""
+        for username in ['JaneDoe', 'JohnSmith', 'JaneDoe', 'Someone']:
+            for i in range(3):
+                self.throttle.record_failure(username)
+        
+        self.assertTrue(self.throttle.is_throttled('JaneDoe'))
+        self.assertFalse(self.throttle.is_throttled('JohnSmith'))
+        self.assertTrue(self.throttle.is_throttled('Someone'))
@@ -0,0 +1,26 @@
+from unittest import TestCase
+
+from pdf_assets import fetch_url, RemoteURLBlocked, VENDORED_STYLESHEETS
+
+class PDFAssetsTestCase(TestCase):
+    """Test fetching assets for WeasyPrint renders without the network."""
+    
+    def test_vendored_stylesheet(self):
+        """Do links to vendored stylesheets get an empty stylesheet instead of going to the CDN?"""
+        for url in VENDORED_STYLESHEETS:
+            result = fetch_url(url)
+            self.assertEqual(result['string'], '')
+            self.assertEqual(result['mime_type'], 'text/css')
+            
+    def test_static_file(self):
+        """Are /static/ urls read from the static folder?"""
+        result = fetch_url('http://localhost/static/pdf/bootstrap-grid.css')
+        with result['file_obj'] as file:
+            self.assertIn(b'.col-6', file.read())
+        self.assertEqual(result['mime_type'], 'text/css')
+        
+    def test_remote_url(self):
+        """Are other urls refused?"""
+        for url in ['https://example.com/style.css', 'http://localhost/static/../app.py', 'http://localhost/static/missing.css', 'file:///etc/passwd']:
+            with self.assertRaises(RemoteURLBlocked):
+                fetch_url(url)
@@ -0,0 +1,110 @@
+from unittest import TestCase
+import os
+import tempfile
+from unittest import mock
+
+from pdf_cache import PDFCache, get_cache_key
+
+QUESTIONS = [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2},
+             {'answer': 30, 'expression': '45 - 15', 'first': 45, 'operation': '-', 'second': 15}]
+
+class PDFCacheTestCase(TestCase):
+    """Test the rendered pdf cache."""
+
+    def setUp(self):
+        """Count how many times a pdf is rendered."""
+        self.renders = 0
+
+    def render(self, size=10):
+        """Stand in for rendering a pdf."""
+        self.renders += 1
+        return b'x' * size
+
+    def test_cache_key(self):
+        """Do the sheet type and questions change the cache key?"""
+        self.assertEqual(get_cache_key('worksheet', QUESTIONS), get_cache_key('worksheet', list(QUESTIONS)))
+        self.assertNotEqual(get_cache_key('worksheet', QUESTIONS), get_cache_key('answer-key', QUESTIONS))
+        self.assertNotEqual(get_cache_key('worksheet', QUESTIONS), get_cache_key('worksheet', QUESTIONS[:1]))
+        self.assertNotEqual(get_cache_key('worksheet', QUESTIONS, 'v1'), get_cache_key('worksheet', QUESTIONS, 'v2'))
+
+    def cache_pdf(self, cache, sheet, questions, size=10):
+        """Get a pdf from the cache the way render_sheet_pdfs does, rendering and caching it on a miss."""
+        key = get_cache_key(sheet, questions)
+        data = cache.get(key)
+        if data is None:
+            data = self.render(size)
+            cache.set(key, data)
+        return data
+
+    def test_get_set(self):
+        """Is a cached pdf returned by get, and a missing one counted as a miss?"""
+        cache = PDFCache(max_bytes=100)
+        key = get_cache_key('worksheet', QUESTIONS)
+
+        self.assertIsNone(cache.get(key))
+        cache.set(key, b'%PDF')
+        self.assertEqual(cache.get(key), b'%PDF')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_size_bound(self):
+        """Are the least recently used pdfs evicted over the size bound?"""
+        cache = PDFCache(max_bytes=25)
+        self.cache_pdf(cache, 'worksheet', QUESTIONS)
+        self.cache_pdf(cache, 'answer-key', QUESTIONS)
+        self.cache_pdf(cache, 'worksheet', QUESTIONS)
+        self.cache_pdf(cache, 'worksheet', QUESTIONS[:1])
+
+        self.assertEqual(cache.size, 20)
+        self.cache_pdf(cache, 'answer-key', QUESTIONS)
+        self.assertEqual(self.renders, 4)
+
+    def test_disk_tier(self):
+        """Can a pdf rendered by one worker be read by another from disk?"""
+        with tempfile.TemporaryDirectory() as directory:
+            self.cache_pdf(PDFCache(max_bytes=100, directory=directory), 'worksheet', QUESTIONS)
+            data = self.cache_pdf(PDFCache(max_bytes=100, directory=directory), 'worksheet', QUESTIONS)
+
+            self.assertEqual(data, b'x' * 10)
+            self.assertEqual(self.renders, 1)
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_disk_prune(self):
+        """Are the oldest pdfs removed from disk over the disk size bound?"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PDFCache(max_bytes=100, directory=directory, disk_max_bytes=15)
+            self.cache_pdf(cache, 'worksheet', QUESTIONS)
+            self.cache_pdf(cache, 'answer-key', QUESTIONS)
+
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_disk_prune_interval(self):
+        """Is the disk only scanned after a tenth of its size was written?"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PDFCache(max_bytes=100, directory=directory, disk_max_bytes=1000)
+            with mock.patch.object(cache, 'prune_disk') as prune_disk:
+                for i in range(25):
+                    cache.set(f'key{i}', b'x' * 10)
+
+            self.assertEqual(prune_disk.call_count, 2)
+
+    def test_disk_write_error(self):
+        """Is a pdf still cached in memory when writing it to disk fails, without leaving its temporary file behind?"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PDFCache(max_bytes=100, directory=directory)
+            with mock.patch('pdf_cache.os.replace', side_effect=OSError('No space left on device')), self.assertLogs('pdf_cache', 'WARNING'):
+                cache.set('key', b'x' * 10)
+
+            self.assertEqual(cache.get('key'), b'x' * 10)
+            self.assertEqual(os.listdir(directory), [])
+
+    def test_disk_prune_temp_files(self):
+        """Are temporary files left by failed writes removed when pruning, but not ones still being written?"""
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PDFCache(max_bytes=100, directory=directory, disk_max_bytes=1000)
+            for name in ['old.tmp', 'new.tmp']:
+                with open(os.path.join(directory, name), 'wb') as file:
+                    file.write(b'x' * 10)
+            os.utime(os.path.join(directory, 'old.tmp'), (0, 0))
+            cache.prune_disk()
+
+            self.assertEqual(os.listdir(directory), ['new.tmp'])
@@ -0,0 +1,85 @@
+import sys
+import threading
+from collections import Counter
+from unittest import TestCase
+
+from profiler import Profiler, collapse_stack, OTHER_STACKS
+
+def wait_in_render(started, done):
+    """Stand in for a slow render that the profiler samples."""
+    started.set()
+    done.wait(10)
+
+class ProfilerTestCase(TestCase):
+    """Test sampling the stacks of profiled requests."""
+    
+    def setUp(self):
+        # A long interval keeps the sampler thread out of the way, so the tests take the samples themselves.
+        self.profiler = Profiler(routes=['render_new_pdf'], interval=60, max_stacks=2)
+        self.done = threading.Event()
+    
+    def tearDown(self):
+        self.done.set()
+    
+    def profile_thread(self, endpoint):
+        """Start a thread that is profiled as a request to endpoint while it waits in wait_in_render."""
+        started = threading.Event()
+        
+        def request():
+            self.profiler.start(endpoint)
+            try:
+                wait_in_render(started, self.done)
+            finally:
+                self.profiler.stop()
+        
+        thread = threading.Thread(target=request)
+        thread.start()
+        started.wait(10)
+        return thread
+    
+    def test_collapse_stack(self):
+        """Are frames named by module and function, outermost first?"""
+        stack = collapse_stack(sys._getframe())
+        
+        self.assertTrue(stack.endswith(';test_profiler.test_collapse_stack'))
+    
+    def test_should_profile(self):
+        """Are listed routes always profiled and others by sample rate?"""
+        profiler = Profiler(routes=['upload'], sample_rate=0.1, rand=lambda: 0.5)
+        
+        self.assertTrue(profiler.enabled)
+        self.assertTrue(profiler.should_profile('upload'))
+        self.assertFalse(profiler.should_profile('index'))
+        profiler.rand = lambda: 0.05
+        self.assertTrue(profiler.should_profile('index'))
+        self.assertFalse(Profiler(routes=[], sample_rate=0).enabled)
+    
+    def test_sample(self):
+        """Are the stacks of profiled threads counted per endpoint, and no longer once their requests finish?"""
+        thread = self.profile_thread('render_new_pdf')
+        self.profiler.sample()
+        self.profiler.sample()
+        self.done.set()
+        thread.join()
+        self.profiler.sample()
+        
+        lines = self.profiler.collapsed().splitlines()
+        self.assertEqual(len(lines), 1)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(stack.startswith('render_new_pdf;'))
+        self.assertIn(';test_profiler.wait_in_render;', stack)
+        self.assertEqual(count, '2')
+        self.assertEqual(self.profiler.collapsed('upload'), '')
+        
+        self.profiler.clear()
+        self.assertEqual(self.profiler.collapsed(), '')
+    
+    def test_max_stacks(self):
+        """Are stacks past max_stacks for an endpoint counted together?"""
+        self.profiler._stacks['upload'] = Counter({'a': 1, 'b': 1})
+        thread = self.profile_thread('upload')
+        self.profiler.sample()
+        self.done.set()
+        thread.join()
+        
+        self.assertIn(f'upload;{OTHER_STACKS} 1\n', self.profiler.collapsed('upload'))
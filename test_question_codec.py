@@ -0,0 +1,30 @@
+from unittest import TestCase
+
+from question_codec import encode_questions, decode_questions
+from question_generator import generate_questions
+
+QUESTIONS = [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2},
+             {'answer': 1440, 'expression': '40 * 36', 'first': 40, 'operation': '*', 'second': 36},
+             {'answer': 30, 'expression': '45 - 15', 'first': 45, 'operation': '-', 'second': 15}]
+
+class QuestionCodecTestCase(TestCase):
+    """Test packing questions into a compact string."""
+
+    def test_encode(self):
+        """Are questions packed into a short string?"""
+        self.assertEqual(encode_questions(QUESTIONS), '88/2;40*36;45-15')
+
+    def test_round_trip(self):
+        """Do generated questions come back the same after packing and unpacking?"""
+        questions = generate_questions('random', 30, {'min': -50, 'max': 50, 'negative': 1})
+
+        self.assertEqual(decode_questions(encode_questions(questions)), questions)
+
+    def test_empty(self):
+        """Does an empty string unpack to no questions?"""
+        self.assertEqual(decode_questions(''), [])
+
+    def test_invalid(self):
+        """Are strings that aren't questions rejected?"""
+        with self.assertRaises(ValueError):
+            decode_questions('88/2;hello')
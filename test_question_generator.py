@@ -0,0 +1,70 @@
+from unittest import TestCase
+import random
+
+from question_generator import generate_questions, draw_divisor, OPERAND_LIMIT
+
+class QuestionGeneratorTestCase(TestCase):
+    """Test the local question generator."""
+
+    def setUp(self):
+        """Seed the random number generator so failures can be reproduced."""
+        self.rand = random.Random(1234)
+
+    def test_question_shape(self):
+        """Do generated questions have the same keys as the math api?"""
+        questions = generate_questions('random', 30, {'min': 0, 'max': 100}, rand=self.rand)
+
+        self.assertEqual(len(questions), 30)
+        for question in questions:
+            self.assertEqual(set(question), {'expression', 'answer', 'first', 'second', 'operation'})
+            self.assertEqual(question['expression'], f"{question['first']} {question['operation']} {question['second']}")
+
+    def test_operands_in_range(self):
+        """Are the numbers in each question between the minimum and maximum?"""
+        for operations in ['add', 'sub', 'mul', 'div']:
+            for question in generate_questions(operations, 30, {'min': -20, 'max': 50}, rand=self.rand):
+                self.assertTrue(-20 <= question['first'] <= 50)
+                self.assertTrue(-20 <= question['second'] <= 50)
+
+    def test_subtraction_without_negative(self):
+        """Are subtraction answers non-negative when negative results are not allowed?"""
+        for question in generate_questions('sub', 30, {'min': 0, 'max': 10}, rand=self.rand):
+            self.assertEqual(question['operation'], '-')
+            self.assertGreaterEqual(question['answer'], 0)
+
+    def test_division_whole_answers(self):
+        """Do division questions always have whole number answers?"""
+        for question in generate_questions('div', 30, {'min': 0, 'max': 100}, rand=self.rand):
+            self.assertNotEqual(question['second'], 0)
+            self.assertEqual(question['first'], question['second'] * question['answer'])
+
+    def test_division_only_zero(self):
+        """Does division raise an error when zero is the only number allowed?"""
+        with self.assertRaises(ValueError):
+            generate_questions('div', 5, {'min': 0, 'max': 0}, rand=self.rand)
+
+    def test_division_wide_range(self):
+        """Are divisors drawn from the widest allowed range without listing it?"""
+        questions = generate_questions('div', 30, {'min': -OPERAND_LIMIT, 'max': OPERAND_LIMIT}, rand=self.rand)
+
+        for question in questions:
+            self.assertNotEqual(question['second'], 0)
+            self.assertTrue(-OPERAND_LIMIT <= question['first'] <= OPERAND_LIMIT)
+
+    def test_draw_divisor_skips_zero(self):
+        """Is every number in the range but zero drawn?"""
+        divisors = {draw_divisor(-2, 2, self.rand) for i in range(200)}
+
+        self.assertEqual(divisors, {-2, -1, 1, 2})
+        self.assertEqual({draw_divisor(0, 1, self.rand) for i in range(20)}, {1})
+
+    def test_operands_too_big(self):
+        """Are numbers past OPERAND_LIMIT turned away instead of generated?"""
+        for params in [{'min': 0, 'max': 10 ** 30}, {'min': -OPERAND_LIMIT - 1, 'max': 0}]:
+            with self.assertRaises(ValueError):
+                generate_questions('div', 5, params, rand=self.rand)
+
+    def test_unsupported_operation(self):
+        """Does the generator reject unknown operations?"""
+        with self.assertRaises(ValueError):
+            generate_questions('pow', 5, {'min': 0, 'max': 10}, rand=self.rand)
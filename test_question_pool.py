@@ -0,0 +1,80 @@
+import threading
+from unittest import TestCase
+
+from question_generator import generate_questions
+from question_pool import QuestionPool
+
+class QuestionPoolTestCase(TestCase):
+    """Test the pool of pre-generated questions."""
+
+    def setUp(self):
+        """Create a pool that refills in the foreground and counts calls to the generator."""
+        self.calls = []
+
+        def fill(operations, number_questions, params):
+            self.calls.append((operations, number_questions))
+            return generate_questions(operations, number_questions, params)
+
+        self.pool = QuestionPool(fill, buffer_size=50, max_keys=2, background=False)
+
+    def test_miss_then_hit(self):
+        """Is the first draw a miss and the second draw served from the pool?"""
+        params = {'min': 0, 'max': 10}
+        first = self.pool.draw('add', 20, params)
+        second = self.pool.draw('add', 20, params)
+
+        self.assertEqual(len(first), 20)
+        self.assertEqual(len(second), 20)
+        self.assertEqual(self.pool.hits, 1)
+        self.assertEqual(self.pool.misses, 1)
+        # One direct call for the miss, then a refill.  The second draw leaves the buffer above its low water mark.
+        self.assertEqual(self.calls, [('add', 20), ('add', 50)])
+
+    def test_low_water(self):
+        """Is the buffer only refilled once it drops below the low water mark?"""
+        params = {'min': 0, 'max': 10}
+        self.pool.draw('add', 20, params)
+        self.pool.draw('add', 20, params)
+        self.pool.draw('add', 20, params)
+
+        # The last draw leaves 10 questions, under the low water mark of 25, so the 40 missing are made.
+        self.assertEqual(self.calls, [('add', 20), ('add', 50), ('add', 40)])
+        self.assertEqual(self.pool.stats()['questions'], 50)
+
+    def test_background_refill(self):
+        """Are buffers refilled on the pool's worker thread?"""
+        threads = []
+
+        def fill(operations, number_questions, params):
+            threads.append(threading.current_thread().name)
+            return generate_questions(operations, number_questions, params)
+
+        pool = QuestionPool(fill, buffer_size=50, max_keys=2)
+        pool.draw('add', 20, {'min': 0, 'max': 10})
+        pool.draw('sub', 20, {'min': 0, 'max': 10})
+        pool.join()
+
+        # The misses are made on the calling thread and both refills on the one worker.
+        self.assertEqual(sorted(threads), sorted([threading.current_thread().name] * 2 + ['question-pool-refill-0'] * 2))
+        self.assertEqual(pool.stats()['questions'], 100)
+
+    def test_keys_are_separate(self):
+        """Do different parameters draw from different buffers?"""
+        self.pool.draw('add', 5, {'min': 0, 'max': 10})
+        questions = self.pool.draw('sub', 5, {'min': 0, 'max': 10})
+
+        self.assertEqual(self.pool.misses, 2)
+        self.assertTrue(all(question['operation'] == '-' for question in questions))
+
+    def test_lru_eviction(self):
+        """Is the least recently used key evicted when the pool is over its key cap?"""
+        self.pool.draw('add', 5, {'min': 0, 'max': 10})
+        self.pool.draw('sub', 5, {'min': 0, 'max': 10})
+        self.pool.draw('add', 5, {'min': 0, 'max': 10})
+        self.pool.draw('mul', 5, {'min': 0, 'max': 10})
+
+        stats = self.pool.stats()
+        self.assertEqual(stats['keys'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        self.pool.draw('sub', 5, {'min': 0, 'max': 10})
+        self.assertEqual(self.pool.misses, 4)
@@ -0,0 +1,52 @@
+from unittest import TestCase
+import time
+
+from render_service import RenderService, RenderQueueFull
+
+def fake_render(html, base_url=None):
+    """Stand in for WeasyPrint that takes a moment to render."""
+    time.sleep(0.2)
+    return html.encode('utf8')
+
+def render_all(service, documents):
+    """Submit html documents together and wait for their pdfs."""
+    futures = [service.submit(html) for html in documents]
+    return [future.result() for future in futures]
+
+def no_warm_up():
+    """Skip importing WeasyPrint in the test workers."""
+
+class RenderServiceTestCase(TestCase):
+    """Test the pdf render pool."""
+
+    def test_render_inline(self):
+        """Are pdfs rendered in the calling thread when there are no workers?"""
+        service = RenderService(max_workers=0, render=fake_render)
+
+        self.assertEqual(render_all(service, ['<p>one</p>', '<p>two</p>']), [b'<p>one</p>', b'<p>two</p>'])
+
+    def test_render_parallel(self):
+        """Are pdfs rendered in parallel on the worker processes?"""
+        service = RenderService(max_workers=2, render=fake_render, initializer=no_warm_up)
+        try:
+            # Start the workers before timing.
+            render_all(service, ['<p>warm</p>', '<p>warm</p>'])
+            start = time.perf_counter()
+            pdfs = render_all(service, ['<p>one</p>', '<p>two</p>'])
+            elapsed = time.perf_counter() - start
+        finally:
+            service.shutdown()
+
+        self.assertEqual(pdfs, [b'<p>one</p>', b'<p>two</p>'])
+        self.assertLess(elapsed, 0.35)
+
+    def test_queue_full(self):
+        """Is an error raised when the render queue stays full?"""
+        service = RenderService(max_workers=1, max_queue=1, queue_timeout=0.01, render=fake_render, initializer=no_warm_up)
+        try:
+            future = service.submit('<p>one</p>')
+            with self.assertRaises(RenderQueueFull):
+                service.submit('<p>two</p>')
+            self.assertEqual(future.result(), b'<p>one</p>')
+        finally:
+            service.shutdown()
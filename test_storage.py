@@ -0,0 +1,100 @@
+from unittest import TestCase
+import tempfile
+
+from storage import StorageBackend, LocalStorage, MemoryStorage, ObjectNotFound, NotModified, InvalidRange
+
+PDF_BYTES = b'%PDF-1.7 ' + bytes(range(256)) * 10
+
+class StorageTests:
+    """Tests shared by the local storage backends."""
+
+    def read(self, stored):
+        """Read every chunk of a stored object."""
+        return b''.join(stored.body)
+
+    def test_put_open(self):
+        """Can a stored pdf be read back?"""
+        self.storage.put('a.pdf', PDF_BYTES)
+        stored = self.storage.open('a.pdf')
+
+        self.assertEqual(self.read(stored), PDF_BYTES)
+        self.assertEqual(stored.content_length, len(PDF_BYTES))
+        self.assertIsNone(stored.content_range)
+
+    def test_open_range(self):
+        """Can part of a stored pdf be read with a range header?"""
+        self.storage.put('a.pdf', PDF_BYTES)
+        stored = self.storage.open('a.pdf', byte_range='bytes=10-19')
+
+        self.assertEqual(self.read(stored), PDF_BYTES[10:20])
+        self.assertEqual(stored.content_length, 10)
+        self.assertEqual(stored.content_range, f'bytes 10-19/{len(PDF_BYTES)}')
+
+    def test_open_invalid_range(self):
+        """Is a range past the end of the pdf rejected?"""
+        self.storage.put('a.pdf', PDF_BYTES)
+
+        with self.assertRaises(InvalidRange):
+            self.storage.open('a.pdf', byte_range=f'bytes={len(PDF_BYTES) + 10}-')
+
+    def test_open_not_modified(self):
+        """Is a matching etag reported as not modified?"""
+        self.storage.put('a.pdf', PDF_BYTES)
+        etag = self.storage.metadata('a.pdf')['etag']
+
+        with self.assertRaises(NotModified):
+            self.storage.open('a.pdf', if_none_match=etag)
+
+    def test_delete_many(self):
+        """Are deleted pdfs gone, and are other pdfs kept?"""
+        for key in ['a.pdf', 'b.pdf', 'c.pdf']:
+            self.storage.put(key, PDF_BYTES)
+
+        self.assertEqual(self.storage.delete_many(['a.pdf', 'b.pdf', 'missing.pdf']), [])
+        self.assertEqual([obj['Key'] for obj in self.storage.list()], ['c.pdf'])
+        with self.assertRaises(ObjectNotFound):
+            self.storage.open('a.pdf')
+
+    def test_metadata(self):
+        """Does the metadata have the size of the pdf?"""
+        self.storage.put('a.pdf', PDF_BYTES)
+
+        self.assertEqual(self.storage.metadata('a.pdf')['size'], len(PDF_BYTES))
+        with self.assertRaises(ObjectNotFound):
+            self.storage.metadata('missing.pdf')
+
+class LocalStorageTestCase(StorageTests, TestCase):
+    """Test the local filesystem storage backend."""
+
+    def setUp(self):
+        """Store pdfs in a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage = LocalStorage(self.directory.name)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        self.directory.cleanup()
+
+    def test_key_outside_directory(self):
+        """Can a key reach outside the storage directory?"""
+        with self.assertRaises(ObjectNotFound):
+            self.storage.open('../etc/passwd')
+
+class MemoryStorageTestCase(StorageTests, TestCase):
+    """Test the in memory storage backend."""
+
+    def setUp(self):
+        """Store pdfs in memory."""
+        self.storage = MemoryStorage()
+
+class StorageBackendTestCase(TestCase):
+    """Test the storage backend interface."""
+
+    def test_incomplete_backend(self):
+        """Does a backend missing a method fail when it is created?"""
+        class PutOnlyStorage(StorageBackend):
+            def put(self, key, data):
+                pass
+
+        with self.assertRaises(TypeError):
+            PutOnlyStorage()
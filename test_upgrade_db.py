@@ -0,0 +1,56 @@
+from app import app
+from unittest import TestCase
+from models import db, upgrade_db, User
+from sqlalchemy import inspect, text
+
+app.config['SQLALCHEMY_DATABASE_URI'] = "postgresql:///worksheet_generator_test"
+app.config['SQLALCHEMY_ECHO'] = False
+app.config['TESTING'] = True
+
+db.drop_all()
+db.create_all()
+
+class UpgradeDbTestCase(TestCase):
+    """Test bringing an older database up to date."""
+
+    def setUp(self):
+        User.query.delete()
+        db.session.add(User(username='JaneDoe', email='test@email.com', password='GreatPassword123'))
+        db.session.commit()
+        db.session.remove()
+
+    def tearDown(self):
+        db.session.rollback()
+
+    def test_adds_worksheet_id(self):
+        """Is the worksheet_id column added to pdfs without losing data?"""
+        with db.engine.begin() as connection:
+            connection.execute(text('ALTER TABLE pdfs DROP COLUMN worksheet_id'))
+            connection.execute(text('DROP TABLE worksheets'))
+
+        upgrade_db()
+
+        inspector = inspect(db.engine)
+        self.assertIn('worksheet_id', {column['name'] for column in inspector.get_columns('pdfs')})
+        self.assertIn('ix_pdfs_worksheet_id', {index['name'] for index in inspector.get_indexes('pdfs')})
+        self.assertIn('worksheets', inspector.get_table_names())
+        self.assertEqual(User.query.one().username, 'JaneDoe')
+
+    def test_up_to_date(self):
+        """Can it be run on a database that is already up to date?"""
+        upgrade_db()
+        upgrade_db()
+
+        self.assertIn('worksheet_id', {column['name'] for column in inspect(db.engine).get_columns('pdfs')})
+
+    def test_adds_indexes(self):
+        """Are the indexes listing a user's pdfs and worksheets added?"""
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP INDEX ix_pdfs_user_id_timestamp'))
+            connection.execute(text('DROP INDEX ix_worksheets_user_id_timestamp'))
+
+        upgrade_db()
+
+        inspector = inspect(db.engine)
+        self.assertIn('ix_pdfs_user_id_timestamp', {index['name'] for index in inspector.get_indexes('pdfs')})
+        self.assertIn('ix_worksheets_user_id_timestamp', {index['name'] for index in inspector.get_indexes('worksheets')})
@@ -0,0 +1,52 @@
+from unittest import TestCase
+
+from user_cache import UserCache
+
+class FakeClock:
+    """Clock that only moves when told to."""
+    
+    def __init__(self):
+        self.now = 0
+        
+    def __call__(self):
+        return self.now
+
+class UserCacheTestCase(TestCase):
+    """Test the per worker user cache."""
+    
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = UserCache(ttl=60, max_size=2, clock=self.clock)
+        
+    def test_get_set(self):
+        """Are cached users returned until they expire?"""
+        self.cache.set(1, {'id': 1, 'username': 'JaneDoe'})
+        self.assertEqual(self.cache.get(1), {'id': 1, 'username': 'JaneDoe'})
+        self.assertIsNone(self.cache.get(2))
+        
+        self.clock.now = 60
+        self.assertIsNone(self.cache.get(1))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+        
+    def test_invalidate(self):
+        """Is an invalidated user looked up again?"""
+        self.cache.set(1, {'id': 1})
+        self.cache.invalidate(1)
+        self.assertIsNone(self.cache.get(1))
+        
+    def test_max_size(self):
+        """Is the least recently used user dropped when the cache is full?"""
+        self.cache.set(1, {'id': 1})
+        self.cache.set(2, {'id': 2})
+        self.cache.get(1)
+        self.cache.set(3, {'id': 3})
+        
+        self.assertIsNotNone(self.cache.get(1))
+        self.assertIsNone(self.cache.get(2))
+        self.assertIsNotNone(self.cache.get(3))
+        
+    def test_disabled(self):
+        """Does a ttl of 0 turn the cache off?"""
+        cache = UserCache(ttl=0)
+        cache.set(1, {'id': 1})
+        self.assertIsNone(cache.get(1))
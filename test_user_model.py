@@ -1,6 +1,8 @@
 from app import app
 from unittest import TestCase
-from models import db, User
+from datetime import datetime
+from models import db, User, PDF
+from passwords import PasswordHasher, password_hasher, get_rounds
 from sqlalchemy.exc import IntegrityError
 
 app.config['SQLALCHEMY_DATABASE_URI'] = "postgresql:///worksheet_generator_test"
@@ -75,6 +77,15 @@ class UserModelTestCase(TestCase):
         auth_user = User.authenticate("JaneDoe", "GreatPassword123")
         self.assertEqual(auth_user, self.user)
         
+    def test_user_authenticate_rehash(self):
+        """Is the password rehashed on login when the bcrypt cost factor has changed?"""
+        self.user.password = PasswordHasher(rounds=4, workers=0).hash("GreatPassword123")
+        db.session.commit()
+        
+        auth_user = User.authenticate("JaneDoe", "GreatPassword123")
+        self.assertEqual(auth_user, self.user)
+        self.assertEqual(get_rounds(User.query.get(self.user.id).password), password_hasher.rounds)
+        
     def test_user_authenticate_wrong_username(self):
         """Test if User.authenticate fails to return a user when given an invalid username."""
         auth_user = User.authenticate("WrongName", "GreatPassword123")
@@ -103,4 +114,13 @@ class UserModelTestCase(TestCase):
     def test_is_email_taken_none(self):
         """Test is_email_taken class method when email is not taken."""
         user = User.is_email_taken("brandNew@email.com")
-        self.assertIsNone(user)
\ No newline at end of file
+        self.assertIsNone(user)
+        
+    def test_pdf_timestamp(self):
+        """Is a pdf stamped with the time it was created, not the time the app started?"""
+        before = datetime.utcnow()
+        pdf = PDF.create_new_pdf(user_id=self.user.id, filename='Test - Worksheet.pdf', sheet_type='worksheet')
+        db.session.add(pdf)
+        db.session.commit()
+        
+        self.assertGreaterEqual(pdf.timestamp, before)
@@ -1,6 +1,17 @@
-from app import app
+import re
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from html import unescape
+from unittest import mock
+
+from app import app, RENDERERS
+from config import PDF_RENDERER
+from pdf_cache import get_cache_key
+from render_service import RenderService
 from unittest import TestCase
-from models import db, User
+from models import db, User, PDF, SaveJob, Worksheet, Draft
+from passwords import login_throttle
 from sqlalchemy.exc import IntegrityError
 
 app.config['SQLALCHEMY_DATABASE_URI'] = "postgresql:///worksheet_generator_test"
@@ -19,6 +30,7 @@ class UserViewsTestCase(TestCase):
         """Create test client, add sample data."""
         
         User.query.delete()
+        login_throttle.clear()
         
         user = User.register(
             "JaneDoe",
@@ -134,6 +146,19 @@ class UserViewsTestCase(TestCase):
             with client.session_transaction() as session:
                 self.assertIsNone(session.get('user'))
                 
+    def test_login_post_throttled(self):
+        """Is a username locked out after too many failed logins?"""
+        with app.test_client() as client:
+            for i in range(login_throttle.max_failures):
+                client.post('/login', data={'username': 'JaneDoe', 'password': 'WrongPassword'})
+            resp = client.post('/login', data={'username': 'JaneDoe', 'password': 'GreatPassword123'}, follow_redirects=True)
+            html = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('Too many failed log in attempts.', html)
+            with client.session_transaction() as session:
+                self.assertNotIn('user', session)
+            
     def test_logout(self):
         """Can a user login and then logout?"""
         with app.test_client() as client:
@@ -172,6 +197,31 @@ class UserViewsTestCase(TestCase):
             self.assertIn('<h1 class="text-center">Your Account</h1>', html)
             self.assertIn("JaneDoe", html)
             
+    def test_user_show_paginated(self):
+        """Are saved worksheets listed newest first, a page at a time?"""
+        for i in range(5):
+            db.session.add(Worksheet(user_id=self.user.id, name=f'Sheet {i}', questions='1+1', template_version='test', timestamp=datetime(2022, 1, i + 1)))
+        db.session.commit()
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.get('/user?per_page=2')
+            html = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertLess(html.index('Sheet 4'), html.index('Sheet 3'))
+            self.assertNotIn('Sheet 2', html)
+            
+            next_url = unescape(re.search(r'href="(/user\?[^"]*worksheets_before=[^"]*)"', html).group(1))
+            resp = client.get(next_url)
+            html = resp.get_data(as_text=True)
+            
+            self.assertIn('Sheet 2', html)
+            self.assertIn('Sheet 1', html)
+            self.assertNotIn('Sheet 3', html)
+            self.assertNotIn('Sheet 0', html)
+            
     def test_user_show_not_logged_in(self):
         """Can a user see their user profile show page when not logged in?"""
         with app.test_client() as client:
@@ -238,6 +288,17 @@ class UserViewsTestCase(TestCase):
             self.assertIn('<button class="btn btn-secondary" type="submit">\n\t\tApply Changes to Your Account\n\t</button>', html)
             self.assertIn("Invalid password.  Please make sure your password is correct.", html)
             
+    def test_user_edit_post_wrong_password_not_throttled(self):
+        """Do mistyped passwords on the edit page leave log ins alone?"""
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            updated_data = {'username': 'updatedUser', 'password': 'wrongPassword', 'email': 'brandnew@email.com'}
+            for i in range(login_throttle.max_failures):
+                client.post('/user/edit', data=updated_data)
+            
+            self.assertFalse(login_throttle.is_throttled('JaneDoe'))
+            
     def test_user_edit_post_not_logged_in(self):
         """Can a user update their profile when not logged in?"""
         with app.test_client() as client:
@@ -344,4 +405,196 @@ class UserViewsTestCase(TestCase):
             self.assertIn('<h1 class="text-center">Your Account</h1>', html)
             self.assertIn("JaneDoe", html)
             self.assertIn('<button class="btn btn-danger" type="submit">Delete Your Account</button>', html)
-            self.assertIn('Your account has not been deleted.  To delete your account please select &#34;Yes&#34; from the dropdown below.', html)
\ No newline at end of file
+            self.assertIn('Your account has not been deleted.  To delete your account please select &#34;Yes&#34; from the dropdown below.', html)
+            
+    def test_upload_status(self):
+        """Can a user see the status of their save job?"""
+        job = SaveJob.create_new_job(user_id=self.user.id, name='Test')
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.get(f'/upload/{job_id}')
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.json['job']['status'], 'queued')
+            self.assertEqual(resp.json['job']['name'], 'Test')
+            
+    def test_upload_status_other_user(self):
+        """Can a user see the status of another user's save job?"""
+        job = SaveJob.create_new_job(user_id=self.user_2.id, name='Test')
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.get(f'/upload/{job_id}')
+            
+            self.assertEqual(resp.status_code, 404)
+            
+    def test_download_other_users_file(self):
+        """Can a user download a file that belongs to another user?"""
+        pdf = PDF.create_new_pdf(user_id=self.user_2.id, filename='Test - Worksheet.pdf', sheet_type='worksheet')
+        db.session.add(pdf)
+        db.session.commit()
+        key = pdf.unique_s3_filename
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.post('/download', data={'key': key})
+            html = resp.get_data(as_text=True)
+            
+            self.assertNotEqual(resp.mimetype, 'application/pdf')
+            self.assertIn('<h1>The page you are looking for does not exist!</h1>', html)
+            
+    def test_delete_other_users_file(self):
+        """Can a user delete a file that belongs to another user?"""
+        pdf = PDF.create_new_pdf(user_id=self.user_2.id, filename='Test - Worksheet.pdf', sheet_type='worksheet')
+        db.session.add(pdf)
+        db.session.commit()
+        key = pdf.unique_s3_filename
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.post('/delete', data={'key': key}, follow_redirects=True)
+            html = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('Please select a file to delete.', html)
+            self.assertIsNotNone(PDF.query.filter_by(unique_s3_filename=key).first())
+            
+    def test_upload(self):
+        """Can a user save a worksheet?"""
+        draft = Draft.create_new_draft('Test', [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2}, 
+                                                {'answer': 30, 'expression': '45 - 15', 'first': 45, 'operation': '-', 'second': 15}])
+        db.session.add(draft)
+        db.session.commit()
+        draft_id = draft.id
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            with client.session_transaction() as session:
+                session['draft'] = draft_id
+            resp = client.post('/upload', follow_redirects=True)
+            html = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('Worksheet and answer key successfully saved!', html)
+            self.assertIn('Test', html)
+            worksheet = Worksheet.query.filter_by(user_id=self.user.id).one()
+            self.assertEqual(worksheet.questions, '88/2;45-15')
+            self.assertEqual(worksheet.template_version, RENDERERS[PDF_RENDERER])
+            
+    def test_upload_deleted_user(self):
+        """Is a user deleted by another worker logged out when saving, while this worker still has them cached?"""
+        draft = Draft.create_new_draft('Test', [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2}])
+        db.session.add(draft)
+        db.session.commit()
+        draft_id = draft.id
+        user_id = self.user.id
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            client.get('/user')
+            User.query.filter_by(id=user_id).delete()
+            db.session.commit()
+            with client.session_transaction() as session:
+                session['draft'] = draft_id
+            resp = client.post('/upload', follow_redirects=True)
+            html = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('Access unauthorized.  Please log in first to view this page.', html)
+            self.assertEqual(Worksheet.query.filter_by(user_id=user_id).count(), 0)
+            with client.session_transaction() as session:
+                self.assertNotIn('user', session)
+            
+    def test_worksheet_pdf_other_user(self):
+        """Can a user download another user's saved worksheet?"""
+        worksheet = Worksheet.create_new_worksheet(user_id=self.user_2.id, name='Test', questions=[], template_version='test')
+        db.session.add(worksheet)
+        db.session.commit()
+        worksheet_id = worksheet.id
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.get(f'/worksheets/{worksheet_id}/worksheet.pdf')
+            html = resp.get_data(as_text=True)
+            
+            self.assertNotEqual(resp.mimetype, 'application/pdf')
+            self.assertIn('<h1>The page you are looking for does not exist!</h1>', html)
+            
+    def test_worksheet_pdf_saved_layout(self):
+        """Is a saved worksheet rendered with the layout it was saved with?"""
+        questions = [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2}]
+        worksheet = Worksheet.create_new_worksheet(user_id=self.user.id, name='Test', questions=questions, template_version=RENDERERS['weasyprint'])
+        db.session.add(worksheet)
+        db.session.commit()
+        worksheet_id = worksheet.id
+        
+        service = RenderService(max_workers=0, render=lambda html, base_url=None: b'%PDF' + html.encode())
+        with mock.patch('app.pdf_cache.get', return_value=None), mock.patch('app.render_service', service), app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.get(f'/worksheets/{worksheet_id}/worksheet.pdf')
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn(b'88 / 2 =', resp.data)
+            self.assertEqual(resp.headers['ETag'], f'"{get_cache_key("worksheet", questions, RENDERERS["weasyprint"])}"')
+            
+    def test_worksheet_pdf_render_timeout(self):
+        """Is a saved worksheet whose pdf takes too long to render answered with a 503?"""
+        worksheet = Worksheet.create_new_worksheet(user_id=self.user.id, name='Test', questions=[], template_version='test')
+        db.session.add(worksheet)
+        db.session.commit()
+        worksheet_id = worksheet.id
+        
+        with mock.patch('app.pdf_cache.get', return_value=None), mock.patch('app.render_service.submit', return_value=Future()), \
+                mock.patch('app.RENDER_TIMEOUT', 0.01), app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.get(f'/worksheets/{worksheet_id}/worksheet.pdf?renderer=weasyprint')
+            
+            self.assertEqual(resp.status_code, 503)
+            
+    def test_worksheet_pdf_render_crashed(self):
+        """Is a saved worksheet whose render worker crashed answered with a 503?"""
+        worksheet = Worksheet.create_new_worksheet(user_id=self.user.id, name='Test', questions=[], template_version='test')
+        db.session.add(worksheet)
+        db.session.commit()
+        worksheet_id = worksheet.id
+        
+        with mock.patch('app.pdf_cache.get', return_value=None), mock.patch('app.render_service.submit', side_effect=BrokenProcessPool), \
+                app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.get(f'/worksheets/{worksheet_id}/worksheet.pdf?renderer=weasyprint')
+            
+            self.assertEqual(resp.status_code, 503)
+            
+    def test_delete_worksheet(self):
+        """Can a user delete their saved worksheet?"""
+        worksheet = Worksheet.create_new_worksheet(user_id=self.user.id, name='Test', questions=[], template_version='test')
+        db.session.add(worksheet)
+        db.session.commit()
+        worksheet_id = worksheet.id
+        
+        with app.test_client() as client:
+            data = {'username': 'JaneDoe', 'password': 'GreatPassword123'}
+            client.post('/login', data=data, follow_redirects=True)
+            resp = client.post('/delete', data={'worksheet_id': worksheet_id}, follow_redirects=True)
+            html = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('File deleted successfully.', html)
+            self.assertIsNone(Worksheet.query.get(worksheet_id))
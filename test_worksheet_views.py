@@ -1,13 +1,47 @@
-from unittest import TestCase
+import io
+import zipfile
+from collections import Counter
+from concurrent.futures import Future
+from unittest import TestCase, mock
 
 from app import app
+from models import db, Draft
+from render_service import RenderService, RenderQueueFull
+from profiler import Profiler
 
+app.config['SQLALCHEMY_DATABASE_URI'] = "postgresql:///worksheet_generator_test"
+app.config['SQLALCHEMY_ECHO'] = False
 app.config['TESTING'] = True
 app.config['DEBUG_TB_HOSTS'] = ['dont-show-debug-toolbar']
 app.config['WTF_CSRF_ENABLED'] = False
 
+db.create_all()
+
+QUESTIONS = [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2}, 
+             {'answer': 1440, 'expression': '40 * 36', 'first': 40, 'operation': '*', 'second': 36}, 
+             {'answer': 30, 'expression': '45 - 15', 'first': 45, 'operation': '-', 'second': 15},
+             {'answer': 12, 'expression': '40 - 28', 'first': 40, 'operation': '-', 'second': 28}, 
+             {'answer': 15, 'expression': '56 - 41', 'first': 56, 'operation': '-', 'second': 41}]
+
 class WorksheetViewsTestCase(TestCase):
     """Test views for worksheets."""
+    
+    def setUp(self):
+        """Start each test without drafts."""
+        Draft.query.delete()
+        db.session.commit()
+    
+    def tearDown(self):
+        """Clean up any fouled transaction."""
+        db.session.rollback()
+    
+    def add_draft(self, client):
+        """Add a draft with sample questions and put its id in the session."""
+        draft = Draft.create_new_draft('Test', QUESTIONS)
+        db.session.add(draft)
+        db.session.commit()
+        with client.session_transaction() as session:
+            session['draft'] = draft.id
         
     def test_index_route(self):
         """Testing the index route."""
@@ -28,7 +62,39 @@ class WorksheetViewsTestCase(TestCase):
             self.assertEqual(resp.status_code, 200)
             self.assertIn('<h1 class="text-center">Generated Worksheet</h1>', html)
             with client.session_transaction() as session:
-                self.assertIsNotNone(session["questions"])
+                draft = Draft.query.get(session["draft"])
+                self.assertNotIn("questions", session)
+            self.assertEqual(draft.name, 'Test')
+            self.assertEqual(len(draft.get_questions()), 20)
+    
+    def test_index_post_route_blank_variants(self):
+        """Is the class set's number of versions ignored when generating a single worksheet?"""
+        with app.test_client() as client:
+            data = {'name': 'Test', 'operations': 'random', 'number_questions': 20, 'minimum': 0, 'maximum': 10, 'variants': ''}
+            resp = client.post('/', data=data)
+            
+            self.assertEqual(resp.status_code, 302)
+            self.assertTrue(resp.location.endswith('/worksheet/new'))
+            
+    def test_index_route_variants(self):
+        """Is the number of versions shown once, next to the class set button?"""
+        with app.test_client() as client:
+            html = client.get('/').get_data(as_text=True)
+            
+            self.assertEqual(html.count('id="variants"'), 1)
+            self.assertLess(html.index('Generate Worksheet!'), html.index('id="variants"'))
+            self.assertLess(html.index('id="variants"'), html.index('id="class-set-button"'))
+            
+    def test_index_post_route_replaces_draft(self):
+        """Does generating another worksheet replace the previous draft?"""
+        with app.test_client() as client:
+            data = {'name': 'Test', 'operations': 'random', 'number_questions': 20, 'minimum': 0, 'maximum': 10, 'allow_negative': True}
+            client.post('/', data=data)
+            client.post('/', data=data)
+            
+            with client.session_transaction() as session:
+                draft_id = session["draft"]
+            self.assertEqual([draft.id for draft in Draft.query.all()], [draft_id])
                 
     def test_new_worksheet_route_no_questions_in_session(self):
         """Testing redirect from new worksheet route if questions are not in session."""
@@ -42,13 +108,7 @@ class WorksheetViewsTestCase(TestCase):
     def test_worksheet_pdf_route(self):
         """Testing rendering of worksheet pdf."""
         with app.test_client() as client:
-            with client.session_transaction() as session:
-                # Add questions to session
-                session['questions'] = [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2}, 
-                                        {'answer': 1440, 'expression': '40 * 36', 'first': 40, 'operation': '*', 'second': 36}, 
-                                        {'answer': 30, 'expression': '45 - 15', 'first': 45, 'operation': '-', 'second': 15},
-                                        {'answer': 12, 'expression': '40 - 28', 'first': 40, 'operation': '-', 'second': 28}, 
-                                        {'answer': 15, 'expression': '56 - 41', 'first': 56, 'operation': '-', 'second': 41}]
+            self.add_draft(client)
             resp = client.get('/worksheet/new/pdf')
             
             self.assertEqual(resp.status_code, 200)
@@ -66,13 +126,7 @@ class WorksheetViewsTestCase(TestCase):
     def test_answer_key_pdf_route(self):
         """Testing rendering of answer key pdf."""
         with app.test_client() as client:
-            with client.session_transaction() as session:
-                # Add questions to session
-                session['questions'] = [{'answer': 44, 'expression': '88 / 2', 'first': 88, 'operation': '/', 'second': 2}, 
-                                        {'answer': 1440, 'expression': '40 * 36', 'first': 40, 'operation': '*', 'second': 36}, 
-                                        {'answer': 30, 'expression': '45 - 15', 'first': 45, 'operation': '-', 'second': 15},
-                                        {'answer': 12, 'expression': '40 - 28', 'first': 40, 'operation': '-', 'second': 28}, 
-                                        {'answer': 15, 'expression': '56 - 41', 'first': 56, 'operation': '-', 'second': 41}]
+            self.add_draft(client)
             resp = client.get('/answer-key/new/pdf')
             
             self.assertEqual(resp.status_code, 200)
@@ -87,6 +141,154 @@ class WorksheetViewsTestCase(TestCase):
             self.assertEqual(resp.status_code, 200)
             self.assertIn('Please generate a new worksheet before accessing that page.', html)
             
+    def test_pdf_route_render_timeout(self):
+        """Is a pdf that takes too long to render answered with a 503?"""
+        with mock.patch('app.pdf_cache.get', return_value=None), mock.patch('app.render_service.submit', return_value=Future()), \
+                mock.patch('app.RENDER_TIMEOUT', 0.01), app.test_client() as client:
+            self.add_draft(client)
+            resp = client.get('/worksheet/new/pdf?renderer=weasyprint')
+            
+            self.assertEqual(resp.status_code, 503)
+            
+    def test_class_set_route_render_timeout(self):
+        """Is the form shown again when the first pdf of a class set takes too long to render?"""
+        with mock.patch('app.render_service.submit', return_value=Future()), mock.patch('app.RENDER_TIMEOUT', 0.01), app.test_client() as client:
+            data = {'name': 'Test', 'operations': 'add', 'number_questions': 5, 'minimum': 0, 'maximum': 10, 'variants': 3}
+            resp = client.post('/class-set?renderer=weasyprint', data=data)
+            
+            self.assertEqual(resp.status_code, 503)
+            self.assertIn('Too many worksheets are being made right now.', resp.get_data(as_text=True))
+            
+    def test_class_set_route(self):
+        """Does the class set route stream a zip with a worksheet and answer key for each version?"""
+        service = RenderService(max_workers=0, render=lambda html, base_url=None: b'%PDF' + html.encode())
+        with mock.patch('app.render_service', service), app.test_client() as client:
+            data = {'name': 'Test', 'operations': 'add', 'number_questions': 5, 'minimum': 0, 'maximum': 10, 'variants': 3}
+            resp = client.post('/class-set', data=data)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.mimetype, 'application/zip')
+            self.assertIn('Test - Class Set.zip', resp.headers['Content-Disposition'])
+            with zipfile.ZipFile(io.BytesIO(resp.data)) as archive:
+                self.assertEqual(archive.namelist(), [f'Test - Version {version} - {sheet}.pdf' for version in range(1, 4) for sheet in ['Worksheet', 'Answer Key']])
+                self.assertNotEqual(archive.read('Test - Version 1 - Worksheet.pdf'), archive.read('Test - Version 2 - Worksheet.pdf'))
+                
+    def test_class_set_route_busy(self):
+        """Is the form shown again, before any of the zip is sent, when the render pool is full?"""
+        service = RenderService(max_workers=0)
+        with mock.patch('app.render_service', service), mock.patch.object(service, 'submit', side_effect=RenderQueueFull), app.test_client() as client:
+            data = {'name': 'Test', 'operations': 'add', 'number_questions': 5, 'minimum': 0, 'maximum': 10, 'variants': 3}
+            resp = client.post('/class-set?renderer=weasyprint', data=data)
+            html = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 503)
+            self.assertIn('Too many worksheets are being made right now.', html)
+            
+    def test_class_set_route_fails_part_way(self):
+        """Is the zip still complete, with a note in place of the missing files, when a pdf fails after streaming started?"""
+        rendered = []
+        def render(html, base_url=None):
+            if len(rendered) == 2:
+                raise RuntimeError('Render failed')
+            rendered.append(html)
+            return b'%PDF' + html.encode()
+        service = RenderService(max_workers=0, render=render)
+        with mock.patch('app.render_service', service), app.test_client() as client:
+            data = {'name': 'Test', 'operations': 'add', 'number_questions': 5, 'minimum': 0, 'maximum': 10, 'variants': 3}
+            resp = client.post('/class-set?renderer=weasyprint', data=data)
+            
+            self.assertEqual(resp.status_code, 200)
+            with zipfile.ZipFile(io.BytesIO(resp.data)) as archive:
+                self.assertEqual(archive.namelist(), ['Test - Version 1 - Worksheet.pdf', 'Test - Version 1 - Answer Key.pdf', 'Incomplete - Some Versions Could Not Be Rendered.txt'])
+                
+    def test_class_set_route_quoted_name(self):
+        """Can a name with quotes be used as the zip's filename?"""
+        with app.test_client() as client:
+            data = {'name': 'My "Best" Test', 'operations': 'add', 'number_questions': 5, 'minimum': 0, 'maximum': 10, 'variants': 1}
+            resp = client.post('/class-set', data=data)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('filename="My Best Test - Class Set.zip"', resp.headers['Content-Disposition'])
+            self.assertIn("filename*=UTF-8''My%20%22Best%22%20Test%20-%20Class%20Set.zip", resp.headers['Content-Disposition'])
+            
+    def test_worksheet_pdf_route_weasyprint(self):
+        """Can a request ask for its pdf to be rendered from the html template?"""
+        service = RenderService(max_workers=0, render=lambda html, base_url=None: b'%PDF' + html.encode())
+        with mock.patch('app.render_service', service), app.test_client() as client:
+            self.add_draft(client)
+            resp = client.get('/worksheet/new/pdf?renderer=weasyprint')
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp.mimetype, 'application/pdf')
+            self.assertIn(b'88 / 2 =', resp.data)
+            
+    def test_class_set_route_too_many_versions(self):
+        """Is the form shown again when too many versions are asked for?"""
+        with app.test_client() as client:
+            data = {'name': 'Test', 'operations': 'add', 'number_questions': 5, 'minimum': 0, 'maximum': 10, 'variants': 1000}
+            resp = client.post('/class-set', data=data)
+            html = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('<h1>Math Worksheet Generator</h1>', html)
+            
+    def test_metrics_route(self):
+        """Are requests and the db, template and pdf stages they go through counted in /metrics?"""
+        with mock.patch('app.pdf_cache.get', return_value=None), app.test_client() as client:
+            self.add_draft(client)
+            client.get('/')
+            client.get('/worksheet/new/pdf')
+            resp = client.get('/metrics')
+            text = resp.get_data(as_text=True)
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertTrue(resp.content_type.startswith('text/plain; version=0.0.4'))
+            for stage in ['db', 'template', 'pdf_grid']:
+                self.assertIn(f'worksheet_stage_seconds_count{{stage="{stage}"}}', text)
+            self.assertIn('worksheet_request_seconds_count{endpoint="index",status="200"}', text)
+            
+    def test_metrics_route_token(self):
+        """Does /metrics ask for the bearer token when one is set?"""
+        with mock.patch('app.METRICS_TOKEN', 'secret'), app.test_client() as client:
+            self.assertEqual(client.get('/metrics').status_code, 401)
+            self.assertEqual(client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+            self.assertEqual(client.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code, 200)
+            
+    def test_profiled_route(self):
+        """Are requests to profiled routes sampled only while they run?"""
+        profiler = Profiler(routes=['index'], interval=60)
+        with mock.patch('app.profiler', profiler), mock.patch.object(profiler, 'start', wraps=profiler.start) as start, app.test_client() as client:
+            client.get('/')
+            client.get('/badroute404')
+            
+            start.assert_called_once_with('index')
+            self.assertEqual(profiler._active, {})
+            
+    def test_profile_route(self):
+        """Does /profile need PROFILE_TOKEN to be set and sent?"""
+        profiler = Profiler(routes=['index'], interval=60)
+        profiler._stacks['index'] = Counter({'app.index': 3})
+        with mock.patch('app.profiler', profiler), app.test_client() as client:
+            self.assertNotIn('app.index', client.get('/profile').get_data(as_text=True))
+            
+            with mock.patch('app.PROFILE_TOKEN', 'secret'):
+                self.assertEqual(client.get('/profile').status_code, 401)
+                resp = client.get('/profile', headers={'Authorization': 'Bearer secret'})
+                self.assertEqual(resp.get_data(as_text=True), 'index;app.index 3\n')
+                
+                resp = client.delete('/profile', headers={'Authorization': 'Bearer secret'})
+                self.assertEqual(resp.status_code, 204)
+                self.assertEqual(profiler.collapsed(), '')
+            
+    def test_index_numbers_too_big(self):
+        """Are numbers past the form's bounds shown as a form error instead of generated?"""
+        with app.test_client() as client:
+            resp = client.post('/', data={'name': 'Big', 'operations': 'div', 'number_questions': 10, 'minimum': 0, 'maximum': 10 ** 30})
+            
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn('Number must be between', resp.get_data(as_text=True))
+            self.assertEqual(Draft.query.count(), 0)
+            
     def test_404_page(self):
         """Test 404 page."""
         with app.test_client() as client:
@@ -0,0 +1,36 @@
+import io
+import zipfile
+from unittest import TestCase
+
+from zip_stream import iter_zip
+
+class ZipStreamTestCase(TestCase):
+    """Test building zip files on the fly."""
+    
+    def test_iter_zip(self):
+        """Do the chunks make a zip with every file in order?"""
+        files = [('a.pdf', b'%PDF-a'), ('b.pdf', b'%PDF-b' * 1000)]
+        chunks = list(iter_zip(iter(files)))
+        
+        self.assertEqual(len(chunks), 3)
+        with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual([(name, archive.read(name)) for name in archive.namelist()], files)
+            
+    def test_iter_zip_streams(self):
+        """Is each file written out before the next one is read?"""
+        read = []
+        
+        def files():
+            for name in ['a.pdf', 'b.pdf']:
+                read.append(name)
+                yield name, b'%PDF'
+        
+        chunks = iter_zip(files())
+        next(chunks)
+        self.assertEqual(read, ['a.pdf'])
+        
+    def test_iter_zip_empty(self):
+        """Is an empty zip still valid?"""
+        with zipfile.ZipFile(io.BytesIO(b''.join(iter_zip([])))) as archive:
+            self.assertEqual(archive.namelist(), [])
@@ -0,0 +1,51 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import USER_CACHE_TTL, USER_CACHE_MAX_SIZE
+
+class UserCache:
+    """Per worker cache of user column values by user id.  Entries expire after ttl seconds and the least recently used are dropped past max_size."""
+
+    def __init__(self, ttl=USER_CACHE_TTL, max_size=USER_CACHE_MAX_SIZE, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        """Get the cached values for a user, or None if they aren't cached or have expired."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] <= self.clock():
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user_id, values):
+        """Cache a dict of column values for a user."""
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (self.clock() + self.ttl, values)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        """Forget a user after they are edited or deleted."""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Forget every user."""
+        with self._lock:
+            self._entries.clear()
+
+user_cache = UserCache()
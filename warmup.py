@@ -0,0 +1,49 @@
+import logging
+import time
+
+from flask import render_template
+
+from config import PDF_RENDERER, RENDER_TIMEOUT, QUESTION_SOURCE, MATH_API_FALLBACK
+from grid_pdf import write_sheet_pdf
+from render_service import render_service, write_pdf
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+SHEETS = ['worksheet', 'answer-key']
+
+WARM_UP_QUESTIONS = [{'answer': 2, 'expression': '1 + 1', 'first': 1, 'operation': '+', 'second': 1}]
+
+def warm_up(app):
+    """Render a tiny worksheet before workers are forked, so every worker shares the loaded templates, fonts and stylesheets copy-on-write.  Doesn't touch the db, so workers don't inherit its connections."""
+    start = time.perf_counter()
+    with app.test_request_context():
+        for sheet in SHEETS:
+            write_sheet_pdf(sheet, WARM_UP_QUESTIONS)
+            html = render_template(f'{sheet}.html', questions=WARM_UP_QUESTIONS, render=True)
+            # Web workers only render with WeasyPrint themselves when there is no render pool.
+            if render_service.max_workers == 0:
+                try:
+                    write_pdf(html)
+                except Exception:
+                    logger.exception('Could not warm up WeasyPrint')
+    get_storage()
+    # The math api client is imported on first use.  Import it here when it will be used, so the first requests that
+    # need it don't wait on the import together.
+    if QUESTION_SOURCE == 'api' or MATH_API_FALLBACK:
+        import api_helpers
+    logger.info('Warmed up in %.0f ms', (time.perf_counter() - start) * 1000)
+
+def start_render_pool(app):
+    """Start this web worker's render processes before its first request when pdfs are rendered with WeasyPrint.  They are spawned rather than forked, so each one warms itself up as it starts."""
+    if PDF_RENDERER != 'weasyprint' or render_service.max_workers == 0:
+        return
+    with app.test_request_context():
+        html = render_template('worksheet.html', questions=WARM_UP_QUESTIONS, render=True)
+    try:
+        # One tiny render per process, so all of them start now.
+        futures = [render_service.submit(html) for i in range(render_service.max_workers)]
+        for future in futures:
+            future.result(timeout=RENDER_TIMEOUT)
+    except Exception:
+        logger.exception('Could not start the render pool')
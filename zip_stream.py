@@ -0,0 +1,30 @@
+import zipfile
+
+class ZipBuffer:
+    """Write only file that zipfile writes into.  take() hands back what was written since the last call."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        """Get the bytes written since the last call."""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def iter_zip(files, compression=zipfile.ZIP_STORED):
+    """Yield a zip archive of (filename, data) pairs in chunks as it is built.  Only one file is held in memory at a time.  PDFs are already compressed, so files are stored as is by default."""
+    buffer = ZipBuffer()
+    # The buffer can't seek, so zipfile writes each file's size and checksum after its data.
+    with zipfile.ZipFile(buffer, mode='w', compression=compression) as archive:
+        for filename, data in files:
+            archive.writestr(filename, data)
+            yield buffer.take()
+    yield buffer.take()